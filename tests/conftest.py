@@ -23,6 +23,7 @@ if FILENAME not in project_dir_content:
         f'Убедитесь, что у вас верная структура проекта.'
     )
 
+import pytest
 from django.utils.version import get_version
 
 assert get_version() < '3.0.0', 'Пожалуйста, используйте версию Django < 3.0.0'
@@ -36,4 +37,13 @@ assert any(app in INSTALLED_APPS for app in ['posts.apps.PostsConfig', 'posts'])
 pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
+    'core.tests.fixtures',
 ]
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # Страницы лент кэшируются до фиксации транзакции с изменениями,
+    # а тесты откатывают транзакции, поэтому кэш чистится перед каждым.
+    from django.core.cache import cache
+    cache.clear()
@@ -0,0 +1,2 @@
+"""Общие фикстуры для запуска тестов приложений через pytest."""
+pytest_plugins = ['core.tests.fixtures']
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.contrib import admin
+from django.template.response import TemplateResponse
+from django.urls import path
+
+from .db import slowlog
+
+
+class AdminSite(admin.AdminSite):
+    """Админка с отчётом о медленных запросах."""
+
+    index_template = 'admin/yatube_index.html'
+
+    def get_urls(self):
+        return [
+            path('slow-queries/', self.admin_view(self.slow_queries),
+                 name='slow_queries'),
+        ] + super().get_urls()
+
+    def slow_queries(self, request):
+        return TemplateResponse(request, 'admin/slow_queries.html', {
+            **self.each_context(request),
+            'title': 'Медленные запросы',
+            'groups': slowlog.groups(),
+            'threshold': settings.SLOW_QUERY_MS,
+        })
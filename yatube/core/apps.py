@@ -1,5 +1,10 @@
 from django.apps import AppConfig
+from django.contrib.admin.apps import AdminConfig as BaseAdminConfig
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+
+class AdminConfig(BaseAdminConfig):
+    default_site = 'core.admin.AdminSite'
@@ -0,0 +1,253 @@
+"""Нагрузочный прогон именованных маршрутов posts и users.
+
+Запросы идут либо в приложение внутри процесса (django.test.Client,
+тогда считаются и запросы к базе), либо на запущенный сервер по HTTP.
+Итог по каждому маршруту — перцентили задержки, пропускная способность
+и среднее число запросов к базе — сохраняется в JSON и сравнивается с
+предыдущим прогоном.
+"""
+import json
+import math
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime
+
+from django.contrib.auth import get_user_model
+from django.db.models import Max, Min
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Group, Post
+
+from .instrumentation import databases
+
+User = get_user_model()
+
+# Кто обращается к маршруту: кто угодно, только вошедшие или только гости.
+ANY, USER, GUEST = 'any', 'user', 'guest'
+
+Route = namedtuple('Route', ('name', 'method', 'audience', 'params'))
+
+ROUTES = (
+    Route('posts:index', 'GET', ANY, ()),
+    Route('posts:group_list', 'GET', ANY, ('slug',)),
+    Route('posts:profile', 'GET', ANY, ('username',)),
+    Route('posts:post_detail', 'GET', ANY, ('post_id',)),
+    Route('posts:follow_index', 'GET', USER, ()),
+    Route('posts:add_comment', 'POST', USER, ('post_id',)),
+    Route('posts:post_like', 'GET', USER, ('post_id',)),
+    Route('users:login', 'GET', GUEST, ()),
+    Route('users:signup', 'GET', GUEST, ()),
+)
+
+# Debug toolbar показывается только для INTERNAL_IPS; замеры без него.
+REMOTE_ADDR = '192.0.2.1'
+
+# На сколько запросов к базе в среднем можно превысить базовый прогон.
+QUERY_TOLERANCE = 0.5
+
+
+class Sample:
+    """Случайные группы, авторы, посты и пользователи для запросов.
+
+    Выборка делается один раз и без ORDER BY RANDOM(): случайные id
+    берутся из диапазона MIN(id)..MAX(id) генератором прогона, поэтому
+    выборка воспроизводится по --seed и не сканирует таблицы целиком.
+    """
+
+    ATTEMPTS = 5
+
+    def __init__(self, size, rng):
+        self.rng = rng
+        post_ids = self.pick(Post.objects.all(), size)
+        self.values = {
+            'slug': list(Group.objects.filter(
+                pk__in=self.pick(Group.objects.all(), size)).values_list(
+                    'slug', flat=True)),
+            'username': sorted(set(Post.objects.filter(
+                pk__in=post_ids).values_list('author__username', flat=True))),
+            'post_id': post_ids,
+        }
+        self.users = list(User.objects.filter(
+            pk__in=self.pick(User.objects.all(), size)))
+
+    def pick(self, queryset, size):
+        """До `size` случайных существующих id строк queryset."""
+        bounds = queryset.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            return []
+        found = set()
+        for _ in range(self.ATTEMPTS):
+            wanted = size - len(found)
+            if wanted <= 0:
+                break
+            candidates = {self.rng.randint(bounds['low'], bounds['high'])
+                          for _ in range(wanted * 2)} - found
+            found.update(queryset.filter(pk__in=candidates).values_list(
+                'pk', flat=True))
+        return self.rng.sample(sorted(found), min(size, len(found)))
+
+    def supports(self, route):
+        if route.audience == USER and not self.users:
+            return False
+        return all(self.values[param] for param in route.params)
+
+    def request(self, route, auth_ratio):
+        """Путь, данные и пользователь (или None) для одного запроса."""
+        kwargs = {param: self.rng.choice(self.values[param])
+                  for param in route.params}
+        path = reverse(route.name, kwargs=kwargs)
+        user = None
+        if route.audience == USER or (
+                route.audience == ANY and self.rng.random() < auth_ratio):
+            user = self.rng.choice(self.users)
+        data = {'text': 'Замер'} if route.method == 'POST' else None
+        return path, data, user
+
+
+class InProcessRunner:
+    """Запросы к WSGI-приложению в этом же процессе, с подсчётом SQL."""
+
+    concurrency = 1
+
+    def __init__(self):
+        self.clients = {}
+
+    def client(self, user):
+        key = user.pk if user else None
+        if key not in self.clients:
+            client = Client(REMOTE_ADDR=REMOTE_ADDR)
+            if user is not None:
+                client.force_login(user)
+            self.clients[key] = client
+        return self.clients[key]
+
+    def __call__(self, method, path, data, user):
+        client = self.client(user)
+        with ExitStack() as stack:
+            captured = [stack.enter_context(CaptureQueriesContext(db))
+                        for db in databases()]
+            started = time.perf_counter()
+            response = getattr(client, method.lower())(path, data)
+            elapsed = time.perf_counter() - started
+        return (response.status_code, elapsed,
+                sum(len(queries) for queries in captured))
+
+
+class ServerRunner:
+    """Запросы по HTTP к запущенному серверу; SQL не считается."""
+
+    def __init__(self, base_url, password, concurrency):
+        import requests
+        self.requests = requests
+        self.base_url = base_url.rstrip('/')
+        self.password = password
+        self.concurrency = concurrency
+        self.sessions = {}
+
+    def session(self, user):
+        key = user.pk if user else None
+        if key not in self.sessions:
+            session = self.requests.Session()
+            login = self.base_url + reverse('users:login')
+            session.get(login)
+            if user is not None:
+                session.post(login, data={
+                    'username': user.username, 'password': self.password,
+                    'csrfmiddlewaretoken': session.cookies.get('csrftoken'),
+                })
+            self.sessions[key] = session
+        return self.sessions[key]
+
+    def __call__(self, method, path, data, user):
+        session = self.session(user)
+        headers = {'X-CSRFToken': session.cookies.get('csrftoken', '')}
+        started = time.perf_counter()
+        response = session.request(method, self.base_url + path, data=data,
+                                   headers=headers, allow_redirects=False)
+        return response.status_code, time.perf_counter() - started, None
+
+
+def percentile(values, share):
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(share * len(ordered)) - 1, 0)]
+
+
+def summarize(results, elapsed):
+    latencies = [seconds * 1000 for _, seconds, _ in results]
+    queries = [count for _, _, count in results if count is not None]
+    return {
+        'requests': len(results),
+        'errors': sum(status >= 400 for status, _, _ in results),
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'rps': round(len(results) / elapsed, 1),
+        'queries': (round(sum(queries) / len(queries), 2)
+                    if queries else None),
+    }
+
+
+def run(runner, sample, routes, requests, warmup, auth_ratio):
+    """Прогоняет маршруты; возвращает сводку по каждому."""
+    report = {}
+    for route in routes:
+        if not sample.supports(route):
+            continue
+        planned = [(route.method, *sample.request(route, auth_ratio))
+                   for _ in range(warmup + requests)]
+        for request in planned[:warmup]:
+            runner(*request)
+        started = time.perf_counter()
+        if runner.concurrency > 1:
+            with ThreadPoolExecutor(runner.concurrency) as pool:
+                results = list(pool.map(lambda request: runner(*request),
+                                        planned[warmup:]))
+        else:
+            # Клиент в процессе работает в этом же потоке и соединении.
+            results = [runner(*request) for request in planned[warmup:]]
+        report[route.name] = summarize(results,
+                                       time.perf_counter() - started)
+    return report
+
+
+def compare(report, baseline, threshold):
+    """Маршруты, где p95 или число запросов выросли сверх допуска."""
+    regressions = []
+    for name, current in report.items():
+        previous = baseline.get('routes', {}).get(name)
+        if previous is None:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + threshold):
+            regressions.append(
+                f'{name}: p95 {previous["p95_ms"]} → {current["p95_ms"]} мс')
+        if None not in (current['queries'], previous['queries']) and (
+                current['queries'] > previous['queries'] + QUERY_TOLERANCE):
+            regressions.append(
+                f'{name}: запросов {previous["queries"]} → '
+                f'{current["queries"]}')
+    return regressions
+
+
+def latest(directory):
+    """Последний сохранённый прогон в каталоге или None."""
+    if not os.path.isdir(directory):
+        return None
+    names = sorted(name for name in os.listdir(directory)
+                   if name.startswith('http-') and name.endswith('.json'))
+    return os.path.join(directory, names[-1]) if names else None
+
+
+def save(report, directory, meta):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(
+        directory, f'http-{datetime.now():%Y%m%d-%H%M%S-%f}.json')
+    with open(path, 'w') as file:
+        json.dump({'meta': meta, 'routes': report}, file,
+                  ensure_ascii=False, indent=2)
+    return path
@@ -0,0 +1,323 @@
+"""Кэш в файле SQLite (WAL), общий для всех процессов на одной машине.
+
+Записи вытесняются по давности использования, когда суммарный размер
+значений превышает `MAX_BYTES`, и по истечении таймаута. Счётчики
+попаданий и промахов копятся в процессе и периодически сбрасываются в
+файл, поэтому `stats()` показывает сумму по всем воркерам.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS cache (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL,
+        size INTEGER NOT NULL,
+        expires REAL,
+        accessed REAL NOT NULL
+    ) WITHOUT ROWID''',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+    '''CREATE TABLE IF NOT EXISTS stats (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    ) WITHOUT ROWID''',
+    '''INSERT OR IGNORE INTO stats (name, value) VALUES
+        ('bytes', 0), ('hits', 0), ('misses', 0), ('evictions', 0)''',
+    '''CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache
+    BEGIN
+        UPDATE stats SET value = value + new.size WHERE name = 'bytes';
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache
+    BEGIN
+        UPDATE stats SET value = value - old.size WHERE name = 'bytes';
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF size
+    ON cache
+    BEGIN
+        UPDATE stats SET value = value + new.size - old.size
+        WHERE name = 'bytes';
+    END''',
+)
+
+
+class SQLiteCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_bytes = int(options.get('MAX_BYTES', 64 * 1024 * 1024))
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        # Время последнего чтения обновляется не чаще раза в интервал,
+        # чтобы чтения почти никогда не превращались в записи.
+        self._touch_interval = float(options.get('TOUCH_INTERVAL', 10))
+        self._stats_interval = float(options.get('STATS_INTERVAL', 1))
+        self._local = threading.local()
+        self._counts_lock = threading.Lock()
+        self._counts = {'hits': 0, 'misses': 0}
+        self._counts_flushed = time.monotonic()
+
+    @property
+    def _db(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            db = sqlite3.connect(self._path, timeout=self._busy_timeout,
+                                 isolation_level=None,
+                                 check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            with db:
+                for statement in SCHEMA:
+                    db.execute(statement)
+            local.db, local.pid = db, os.getpid()
+        return local.db
+
+    def _count(self, name, amount=1):
+        with self._counts_lock:
+            self._counts[name] += amount
+            if time.monotonic() - self._counts_flushed < self._stats_interval:
+                return
+        self._flush_counts()
+
+    def _flush_counts(self):
+        with self._counts_lock:
+            counts, self._counts = self._counts, dict.fromkeys(self._counts, 0)
+            self._counts_flushed = time.monotonic()
+        with self._db as db:
+            db.executemany(
+                'UPDATE stats SET value = value + ? WHERE name = ?',
+                [(amount, name) for name, amount in counts.items()
+                 if amount])
+
+    def _read(self, keys):
+        """Живые значения по ключам; заодно отмечает использование."""
+        now = time.time()
+        placeholders = ', '.join('?' * len(keys))
+        rows = self._db.execute(
+            f'SELECT key, value, accessed FROM cache '
+            f'WHERE key IN ({placeholders}) '
+            f'AND (expires IS NULL OR expires > ?)',
+            (*keys, now)).fetchall()
+        stale = [(now, key) for key, _, accessed in rows
+                 if now - accessed > self._touch_interval]
+        if stale:
+            with self._db as db:
+                db.executemany('UPDATE cache SET accessed = ? WHERE key = ?',
+                               stale)
+        self._count('hits', len(rows))
+        self._count('misses', len(keys) - len(rows))
+        return {key: pickle.loads(value) for key, value, _ in rows}
+
+    def _write(self, db, items, expires, now):
+        db.executemany(
+            'INSERT INTO cache (key, value, size, expires, accessed) '
+            'VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+            'value = excluded.value, size = excluded.size, '
+            'expires = excluded.expires, accessed = excluded.accessed',
+            [(key, value, len(key) + len(value), expires, now)
+             for key, value in items])
+
+    def _evict(self, db, now):
+        """Удаляет просроченные, затем самые давние записи сверх бюджета."""
+        evicted = db.execute('DELETE FROM cache WHERE expires <= ?',
+                             (now,)).rowcount
+        while db.execute("SELECT value FROM stats WHERE name = 'bytes'"
+                         ).fetchone()[0] > self._max_bytes:
+            deleted = db.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY accessed LIMIT ?)',
+                (self._cull_batch(db),)).rowcount
+            if not deleted:
+                break
+            evicted += deleted
+        if evicted:
+            db.execute("UPDATE stats SET value = value + ? "
+                       "WHERE name = 'evictions'", (evicted,))
+
+    def _cull_batch(self, db):
+        entries = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        return max(1, entries // self._cull_frequency)
+
+    def _set_many(self, items, timeout):
+        now = time.time()
+        items = [(key, pickle.dumps(value, self.pickle_protocol))
+                 for key, value in items]
+        with self._db as db:
+            db.execute('BEGIN IMMEDIATE')
+            self._write(db, items, self.get_backend_timeout(timeout), now)
+            self._evict(db, now)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        with self._db as db:
+            db.execute('BEGIN IMMEDIATE')
+            added = db.execute(
+                'INSERT INTO cache (key, value, size, expires, accessed) '
+                'VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+                'value = excluded.value, size = excluded.size, '
+                'expires = excluded.expires, accessed = excluded.accessed '
+                'WHERE cache.expires <= excluded.accessed',
+                (key, pickled, len(key) + len(pickled),
+                 self.get_backend_timeout(timeout), now)).rowcount
+            if added:
+                self._evict(db, now)
+        return bool(added)
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._read([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self.make_key(key, version=version): key for key in keys}
+        for key in keys:
+            self.validate_key(key)
+        if not keys:
+            return {}
+        return {keys[key]: value
+                for key, value in self._read(list(keys)).items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._set_many([(key, value)], timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        items = []
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            items.append((key, value))
+        if items:
+            self._set_many(items, timeout)
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        expires = self.get_backend_timeout(timeout)
+        with self._db as db:
+            return bool(db.execute(
+                'UPDATE cache SET expires = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (expires, key, time.time())).rowcount)
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        with self._db as db:
+            db.execute('BEGIN IMMEDIATE')
+            row = db.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)', (key, now)).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            pickled = pickle.dumps(value, self.pickle_protocol)
+            db.execute('UPDATE cache SET value = ?, size = ?, accessed = ? '
+                       'WHERE key = ?',
+                       (pickled, len(key) + len(pickled), now, key))
+        return value
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._db.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time())).fetchone() is not None
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._db as db:
+            db.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        with self._db as db:
+            db.executemany('DELETE FROM cache WHERE key = ?',
+                           [(key,) for key in keys])
+
+    def clear(self):
+        with self._db as db:
+            db.execute('DELETE FROM cache')
+
+    def stats(self):
+        """Попадания, промахи, вытеснения и объём по всем процессам."""
+        self._flush_counts()
+        stats = dict(self._db.execute('SELECT name, value FROM stats'))
+        stats['entries'] = self._db.execute(
+            'SELECT COUNT(*) FROM cache').fetchone()[0]
+        requests = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / requests if requests else 0
+        return stats
+
+
+class LocalCache:
+    """Небольшой LRU с коротким TTL в памяти процесса перед общим кэшем.
+
+    Запись идёт в оба уровня, чтение сначала из памяти. Значения не
+    копируются, поэтому изменять полученные объекты нельзя. Свежесть
+    относительно других процессов проверяет вызывающий код, например
+    сравнивая поколение в значении с текущим (см. `posts.caching`).
+    """
+
+    def __init__(self, shared, max_entries=128, timeout=5):
+        self.shared = shared
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _forget(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get(self, key, default=None):
+        with self._lock:
+            expires, value = self._entries.get(key, (0, None))
+            if expires > time.monotonic():
+                self._entries.move_to_end(key)
+                return value
+        return self.get_shared(key, default)
+
+    def get_shared(self, key, default=None):
+        """Читает значение из общего кэша в обход памяти процесса."""
+        value = self.shared.get(key)
+        if value is None:
+            self._forget(key)
+            return default
+        self._remember(key, value)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        self.shared.set(key, value, timeout)
+        self._remember(key, value)
+
+    def delete(self, key):
+        self.shared.delete(key)
+        self._forget(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
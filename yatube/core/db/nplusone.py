@@ -0,0 +1,108 @@
+"""Поиск N+1: одинаковые по форме SELECT с разными параметрами.
+
+`NPlusOneMiddleware` следит за каждым запросом, если задан
+`NPLUSONE_MODE`: 'warn' — предупреждение `NPlusOneWarning`, 'raise' —
+исключение `NPlusOneError` после ответа (в тестах его перевыбросит
+клиент). Для каждой формы сообщается строка шаблона, если запрос
+пришёл из отрисовки, иначе место вызова в нашем коде.
+"""
+import re
+import sys
+import warnings
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.template.base import Node
+
+from ..instrumentation import databases
+from .slowlog import caller, normalize
+
+RENDER = Node.render_annotated.__code__
+
+
+class NPlusOneWarning(UserWarning):
+    pass
+
+
+class NPlusOneError(AssertionError):
+    pass
+
+
+def template_line():
+    """Узел шаблона, который сейчас отрисовывается, или None."""
+    frame = sys._getframe()
+    while frame is not None:
+        if frame.f_code is RENDER:
+            node = frame.f_locals['self']
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                name = origin.template_name or origin.name
+                return (f'{name}:{token.lineno} '
+                        f'({token.contents})')
+        frame = frame.f_back
+    return None
+
+
+class Detector:
+    """Обёртка выполнения, которая группирует SELECT по форме."""
+
+    def __init__(self, threshold=None, ignore=None):
+        self.threshold = threshold or settings.NPLUSONE_THRESHOLD
+        self.ignore = [re.compile(pattern) for pattern in (
+            settings.NPLUSONE_IGNORE if ignore is None else ignore)]
+        self.params = defaultdict(set)
+        self.locations = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            shape = normalize(sql)
+            seen = self.params[shape]
+            seen.add(repr(params))
+            if len(seen) == 2:
+                self.locations[shape] = template_line() or caller()
+        return execute(sql, params, many, context)
+
+    def problems(self):
+        """[(форма, число разных параметров, место)] сверх порога."""
+        return [(shape, len(params), self.locations[shape])
+                for shape, params in self.params.items()
+                if len(params) >= self.threshold
+                and not any(pattern.search(shape)
+                            for pattern in self.ignore)]
+
+    def report(self):
+        return '\n'.join(
+            f'N+1: {count} запросов «{shape[:300]}» из {location}'
+            for shape, count, location in self.problems())
+
+
+@contextmanager
+def detect(mode='raise', threshold=None, ignore=None):
+    """Проверяет блок на N+1 и предупреждает или бросает исключение."""
+    detector = Detector(threshold, ignore)
+    with ExitStack() as stack:
+        for connection in databases():
+            stack.enter_context(connection.execute_wrapper(detector))
+        yield detector
+    report = detector.report()
+    if not report:
+        return
+    if mode == 'raise':
+        raise NPlusOneError(report)
+    warnings.warn(report, NPlusOneWarning, stacklevel=3)
+
+
+class NPlusOneMiddleware:
+    """Проверяет каждый запрос на N+1 в режиме `NPLUSONE_MODE`."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = settings.NPLUSONE_MODE
+        if not mode:
+            return self.get_response(request)
+        with detect(mode):
+            return self.get_response(request)
@@ -0,0 +1,86 @@
+"""Чтение с реплик и привязка к основной базе после записи.
+
+Реплики читаются только внутри запроса, которому это разрешил
+`ReplicaMiddleware`; команды, миграции и транзакции (`use_primary()`)
+работают с `default`. Пользователь, который только что писал, получает
+cookie, и в течение `DATABASE_REPLICA_LAG` секунд его запросы читают
+основную базу, чтобы он сразу видел свой пост или комментарий.
+"""
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from django.conf import settings
+
+PRIMARY_COOKIE = 'primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class _State(threading.local):
+    replicas = False
+    primary = 0
+    written = False
+
+
+_state = _State()
+
+
+def allowed():
+    """Можно ли сейчас читать с реплики."""
+    return _state.replicas and not _state.primary
+
+
+def mark_written():
+    _state.written = True
+
+
+@contextmanager
+def use_replicas():
+    """Разрешает чтение с реплик и отмечает, была ли запись."""
+    previous = _state.replicas, _state.written
+    _state.replicas, _state.written = True, False
+    try:
+        yield _state
+    finally:
+        _state.replicas, _state.written = previous
+
+
+@contextmanager
+def use_primary():
+    """Все чтения внутри блока идут в основную базу."""
+    _state.primary += 1
+    try:
+        yield
+    finally:
+        _state.primary -= 1
+
+
+def _pinned(request):
+    try:
+        return float(request.COOKIES.get(PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class ReplicaMiddleware:
+    """Разрешает безопасным запросам читать с реплик.
+
+    Изменяющие запросы и запросы в течение `DATABASE_REPLICA_LAG` секунд
+    после записи того же клиента читают основную базу.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = request.method not in SAFE_METHODS or _pinned(request)
+        with use_replicas() as state, (
+                use_primary() if pinned else nullcontext()):
+            response = self.get_response(request)
+            written = state.written
+        if written:
+            lag = settings.DATABASE_REPLICA_LAG
+            response.set_cookie(PRIMARY_COOKIE, f'{time.time() + lag:.3f}',
+                                max_age=lag, httponly=True,
+                                samesite='Lax')
+        return response
@@ -0,0 +1,45 @@
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+
+from .. import metrics
+from .replicas import use_primary
+
+
+def is_locked(error):
+    return 'database is locked' in str(error)
+
+
+def atomic_retry(func=None, using=None):
+    """Как `transaction.atomic`, но повторяет транзакцию при блокировке.
+
+    Чтения внутри транзакции идут в основную базу, а не на реплики.
+
+    Если за `timeout` соединения блокировку записи так и не получили,
+    транзакция откатывается и запускается заново с экспоненциально
+    растущей паузой. Внутри уже открытой транзакции повторять нечего —
+    там функция просто выполняется в точке сохранения.
+    """
+    if func is None:
+        return lambda func: atomic_retry(func, using)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if transaction.get_connection(using).in_atomic_block:
+            with use_primary(), transaction.atomic(using=using):
+                return func(*args, **kwargs)
+        attempts = settings.SQLITE_RETRY_ATTEMPTS
+        for attempt in range(attempts):
+            try:
+                with use_primary(), transaction.atomic(using=using):
+                    return func(*args, **kwargs)
+            except OperationalError as error:
+                if not is_locked(error) or attempt == attempts - 1:
+                    raise
+            metrics.db_lock_retries.inc()
+            time.sleep(settings.SQLITE_RETRY_BACKOFF * 2 ** attempt
+                       * random.uniform(0.5, 1.5))
+    return wrapper
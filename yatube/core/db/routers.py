@@ -0,0 +1,85 @@
+import random
+
+from django.conf import settings
+from django.db import connections
+
+from . import replicas
+
+
+def shares_default(alias):
+    """Алиас указывает на тот же файл, что и `default` (зеркало в тестах)."""
+    return (connections[alias].settings_dict['NAME']
+            == connections['default'].settings_dict['NAME'])
+
+
+class AppRouter:
+    """Раскладывает приложения по отдельным файлам SQLite.
+
+    `settings.DATABASE_APPS` сопоставляет метку приложения и алиас базы;
+    остальные приложения остаются в `default`. Так частые записи сессий
+    не ждут общую блокировку записи вместе с постами и комментариями.
+
+    Если алиас указывает на тот же файл, что и `default` (так в тестах,
+    где он объявлен зеркалом), запросы идут в `default`. Поэтому таблицы
+    вынесенных приложений создаются и там.
+    """
+
+    def _target(self, app_label):
+        return settings.DATABASE_APPS.get(app_label)
+
+    def _alias(self, app_label):
+        target = self._target(app_label)
+        if target is None or shares_default(target):
+            return None
+        return target
+
+    def db_for_read(self, model, **hints):
+        return self._alias(model._meta.app_label)
+
+    def db_for_write(self, model, **hints):
+        return self._alias(model._meta.app_label)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if (self._alias(obj1._meta.app_label)
+                != self._alias(obj2._meta.app_label)):
+            return False
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db in ('default', self._target(app_label))
+
+
+class ReplicaRouter:
+    """Читает с реплик из `settings.DATABASE_REPLICAS`, пишет в `default`.
+
+    Реплики — копии `default` только для чтения. Реплика выбирается
+    случайно, если `replicas.allowed()`; иначе читается `default`.
+    Приложения из `DATABASE_APPS` оставлены `AppRouter`.
+    """
+
+    def _replicas(self):
+        return [alias for alias in settings.DATABASE_REPLICAS
+                if not shares_default(alias)]
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in settings.DATABASE_APPS:
+            return None
+        aliases = self._replicas() if replicas.allowed() else ()
+        return random.choice(aliases) if aliases else 'default'
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label in settings.DATABASE_APPS:
+            return None
+        replicas.mark_written()
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {'default', *settings.DATABASE_REPLICAS}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -0,0 +1,143 @@
+"""Журнал медленных запросов с планом выполнения.
+
+Обёртка выполнения стоит на каждом соединении нашего бэкенда. Запрос
+дольше `SLOW_QUERY_MS` миллисекунд пишется в логгер `core.slow_queries`
+(в настройках — ротируемый файл `SLOW_QUERY_LOG`) одной строкой JSON:
+представление, параметры, место вызова в нашем коде и вывод
+EXPLAIN QUERY PLAN. `groups()` собирает записи по отпечатку SQL для
+страницы в админке.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import traceback
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from .. import instrumentation
+
+logger = logging.getLogger('core.slow_queries')
+
+# Кадры отсюда и из бэкенда — не то место, откуда пришёл запрос.
+SKIP_DIRS = (os.path.dirname(__file__), instrumentation.__file__)
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+IN_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+
+MAX_PARAM_LENGTH = 200
+
+
+def normalize(sql):
+    """SQL без литералов и параметров; списки IN (...) любой длины равны."""
+    sql = LITERALS.sub('?', sql).replace('%s', '?')
+    return ' '.join(IN_LISTS.sub('(...)', sql).split())
+
+
+def fingerprint(sql):
+    return hashlib.sha1(normalize(sql).encode()).hexdigest()[:12]
+
+
+def caller():
+    """Ближайший кадр стека из кода проекта."""
+    for frame in reversed(traceback.extract_stack()):
+        path = frame.filename
+        if (path.startswith(settings.BASE_DIR) and 'site-packages' not in path
+                and not path.startswith(SKIP_DIRS)):
+            return (f'{os.path.relpath(path, settings.BASE_DIR)}:'
+                    f'{frame.lineno} in {frame.name}')
+    return None
+
+
+def explain(connection, sql, params):
+    """План SELECT в виде дерева; мимо обёрток, чтобы не зациклиться."""
+    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return []
+    try:
+        with connection.cursor() as cursor:
+            cursor.cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            rows = cursor.cursor.fetchall()
+    except DatabaseError as error:
+        return [f'EXPLAIN не выполнен: {error}']
+    depth = {0: -1}
+    lines = []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node] + detail)
+    return lines
+
+
+def short(value):
+    text = repr(value)
+    if len(text) > MAX_PARAM_LENGTH:
+        return text[:MAX_PARAM_LENGTH] + '…'
+    return text
+
+
+def log(connection, sql, params, many, elapsed):
+    measurement = instrumentation.current()
+    request = measurement and measurement.request
+    logger.warning(json.dumps({
+        'time': time.time(),
+        'ms': round(elapsed * 1000, 2),
+        'database': connection.alias,
+        'view': instrumentation.view_name(request) if request else None,
+        'fingerprint': fingerprint(sql),
+        'sql': sql,
+        'params': ([short(params)] if many
+                   else [short(param) for param in params or ()]),
+        'frame': caller(),
+        'plan': [] if many else explain(connection, sql, params),
+    }, ensure_ascii=False))
+
+
+def slow_query_log(execute, sql, params, many, context):
+    """Обёртка выполнения, которая пишет медленные запросы в журнал."""
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    elapsed = time.perf_counter() - started
+    threshold = settings.SLOW_QUERY_MS
+    if threshold is not None and elapsed * 1000 >= threshold:
+        log(context['connection'], sql, params, many, elapsed)
+    return result
+
+
+def entries(path=None):
+    """Записи журнала вместе с ротированными файлами, старые первыми."""
+    path = path or settings.SLOW_QUERY_LOG
+    paths = [f'{path}.{number}' for number in range(
+        settings.SLOW_QUERY_LOG_BACKUPS, 0, -1)] + [path]
+    for name in paths:
+        if not os.path.exists(name):
+            continue
+        with open(name, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def groups(path=None):
+    """Записи по отпечатку SQL, самые затратные в сумме первыми."""
+    grouped = {}
+    for entry in entries(path):
+        group = grouped.setdefault(entry['fingerprint'], {
+            'fingerprint': entry['fingerprint'],
+            'sql': normalize(entry['sql']),
+            'count': 0, 'total_ms': 0, 'max_ms': 0, 'views': Counter(),
+        })
+        group['count'] += 1
+        group['total_ms'] += entry['ms']
+        group['max_ms'] = max(group['max_ms'], entry['ms'])
+        group['views'][entry['view'] or '-'] += 1
+        group['last'] = entry
+    for group in grouped.values():
+        group['total_ms'] = round(group['total_ms'], 2)
+        group['avg_ms'] = round(group['total_ms'] / group['count'], 2)
+        group['views'] = group['views'].most_common()
+    return sorted(grouped.values(), key=lambda group: -group['total_ms'])
@@ -0,0 +1,55 @@
+"""SQLite для нескольких воркеров: WAL, ожидание блокировки и кэш страниц.
+
+Настройки применяются к каждому новому соединению. Транзакции
+открываются через BEGIN IMMEDIATE: писатель сразу встаёт в очередь за
+блокировкой записи и ждёт её `timeout` секунд, а не получает
+"database is locked" посреди транзакции при попытке повысить
+блокировку чтения до записи.
+
+Прагмы можно переопределить в `OPTIONS['pragmas']`. Медленные запросы
+пишутся в журнал, см. core/db/slowlog.py.
+"""
+import time
+
+from django.db.backends.sqlite3 import base
+
+from ... import metrics
+from ..slowlog import slow_query_log
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение — размер в КиБ, а не в страницах.
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+def configure(connection, pragmas=PRAGMAS):
+    """Выполняет прагмы на соединении sqlite3."""
+    for name, value in pragmas.items():
+        connection.execute(f'PRAGMA {name} = {value}')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.execute_wrappers.append(slow_query_log)
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = {**PRAGMAS, **params.pop('pragmas', {})}
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        configure(connection, self.pragmas)
+        metrics.db_connections.inc(database=self.alias)
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        started = time.perf_counter()
+        self.cursor().execute('BEGIN IMMEDIATE')
+        metrics.db_lock_wait.observe(time.perf_counter() - started,
+                                     database=self.alias)
@@ -0,0 +1,223 @@
+"""Замеры каждого запроса: SQL, время базы и шаблонов, размер ответа.
+
+`InstrumentationMiddleware` подключает к соединениям обёртку выполнения
+запросов и копит значения по имени представления в гистограммах с
+фиксированными границами корзин. Гистограммы живут в памяти процесса и
+показываются сотрудникам на странице `core:request_stats`.
+`ServerTimingMiddleware` отдаёт замеры запроса браузеру в заголовке.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager, nullcontext
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends import django as django_backend
+from django.template.exceptions import TemplateDoesNotExist
+
+from . import metrics
+from .db.routers import shares_default
+
+INF = float('inf')
+MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, INF)
+BUCKETS = {
+    'queries': (0, 1, 2, 3, 5, 10, 20, 50, 100, INF),
+    'db_ms': MS,
+    'template_ms': MS,
+    'total_ms': MS,
+    'response_bytes': (1024, 4096, 16384, 65536, 262144, 1048576, INF),
+}
+
+_state = threading.local()
+
+
+def databases():
+    """Соединения с разными файлами: default, сессии, реплики."""
+    return [connections[alias] for alias in connections
+            if alias == 'default' or not shares_default(alias)]
+
+
+class Measurement:
+    """Замеры одного запроса; заодно обёртка выполнения SQL."""
+
+    def __init__(self, request=None):
+        self.request = request
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.durations = defaultdict(float)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.durations['db'] += time.perf_counter() - started
+
+
+def current():
+    """Замеры текущего запроса или None вне запроса."""
+    return getattr(_state, 'measurement', None)
+
+
+@contextmanager
+def measure(request=None):
+    """Собирает замеры блока; вложенные блоки не мешают внешнему."""
+    previous, measurement = current(), Measurement(request)
+    _state.measurement = measurement
+    try:
+        with ExitStack() as stack:
+            for connection in databases():
+                stack.enter_context(connection.execute_wrapper(measurement))
+            yield measurement
+    finally:
+        measurement.durations['total'] = (time.perf_counter()
+                                          - measurement.started)
+        _state.measurement = previous
+
+
+@contextmanager
+def phase(name):
+    """Добавляет время блока к фазе `name` текущего запроса."""
+    measurement = current()
+    if measurement is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        measurement.durations[name] += time.perf_counter() - started
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def as_dict(self):
+        cumulative, total = {}, 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            cumulative['+Inf' if bound == INF else str(bound)] = total
+        return {'count': self.count, 'sum': round(self.sum, 3),
+                'buckets': cumulative}
+
+
+class Registry:
+    """Гистограммы по представлениям в памяти процесса."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.views = defaultdict(lambda: {
+            name: Histogram(buckets) for name, buckets in BUCKETS.items()})
+
+    def observe(self, view, values):
+        with self.lock:
+            histograms = self.views[view]
+            for name, value in values.items():
+                histograms[name].observe(value)
+
+    def snapshot(self):
+        with self.lock:
+            return {view: {name: histogram.as_dict()
+                           for name, histogram in histograms.items()}
+                    for view, histograms in sorted(self.views.items())}
+
+
+registry = Registry()
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else '<unresolved>'
+
+
+class InstrumentationMiddleware:
+    """Копит замеры каждого запроса по имени представления.
+
+    Стоит первым, чтобы время ответа включало остальные middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with measure(request) as measurement:
+            response = self.get_response(request)
+        size = 0 if response.streaming else len(response.content)
+        view = view_name(request)
+        metrics.request_duration.observe(measurement.durations['total'],
+                                         view=view)
+        registry.observe(view, {
+            'queries': measurement.queries,
+            'db_ms': measurement.durations['db'] * 1000,
+            'template_ms': measurement.durations['template'] * 1000,
+            'total_ms': measurement.durations['total'] * 1000,
+            'response_bytes': size,
+        })
+        return response
+
+
+class ServerTimingMiddleware:
+    """Заголовок Server-Timing с фазами db, thumbnail, template и total.
+
+    Ставится для представлений из `SERVER_TIMING_APPS`; фазы
+    пересекаются: миниатюры строятся во время отрисовки шаблона.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        outer = current()
+        context = nullcontext(outer) if outer else measure(request)
+        with context as measurement:
+            response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        if match and match.app_name in settings.SERVER_TIMING_APPS:
+            response['Server-Timing'] = server_timing(measurement)
+        return response
+
+
+def server_timing(measurement):
+    durations = measurement.durations
+    total = time.perf_counter() - measurement.started
+    return ', '.join((
+        f'db;dur={durations["db"] * 1000:.1f};'
+        f'desc="{measurement.queries} SQL"',
+        f'thumbnail;dur={durations["thumbnail"] * 1000:.1f}',
+        f'template;dur={durations["template"] * 1000:.1f}',
+        f'total;dur={total * 1000:.1f}',
+    ))
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        with phase('template'):
+            return super().render(context, request)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Бэкенд шаблонов Django, который замеряет время отрисовки."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
@@ -0,0 +1,95 @@
+import json
+import os
+import random
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержку, пропускную способность и число запросов '
+            'к базе для маршрутов posts и users и сравнивает с прошлым '
+            'прогоном. Маршруты add_comment и post_like пишут в базу.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100,
+                            help='Замеряемых запросов на маршрут.')
+        parser.add_argument('--warmup', type=int, default=5,
+                            help='Незамеряемых запросов на маршрут.')
+        parser.add_argument('--auth-ratio', type=float, default=0.5,
+                            help='Доля запросов от вошедших пользователей.')
+        parser.add_argument('--routes', nargs='*',
+                            help='Имена маршрутов, по умолчанию все.')
+        parser.add_argument('--url',
+                            help='Адрес запущенного сервера; без него '
+                                 'запросы идут в приложение в процессе.')
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='Параллельных клиентов для --url.')
+        parser.add_argument('--password', default='password',
+                            help='Пароль пользователей для входа по --url.')
+        parser.add_argument('--sample', type=int, default=100,
+                            help='Сколько групп, авторов и постов брать.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output-dir', default=os.path.join(
+            settings.BASE_DIR, 'benchmarks'))
+        parser.add_argument('--baseline',
+                            help='Файл для сравнения, по умолчанию '
+                                 'последний в --output-dir.')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Допустимый рост p95, доля.')
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        routes = benchmark.ROUTES
+        if options['routes']:
+            routes = [route for route in routes
+                      if route.name in options['routes']]
+        if options['url']:
+            runner = benchmark.ServerRunner(
+                options['url'], options['password'], options['concurrency'])
+        else:
+            runner = benchmark.InProcessRunner()
+        baseline_path = options['baseline'] or benchmark.latest(
+            options['output_dir'])
+
+        report = benchmark.run(
+            runner, benchmark.Sample(options['sample'],
+                                     random.Random(options['seed'])),
+            routes, options['requests'], options['warmup'],
+            options['auth_ratio'])
+        path = benchmark.save(report, options['output_dir'], {
+            'created': datetime.now().isoformat(),
+            'target': options['url'] or 'in-process',
+            'requests': options['requests'],
+            'auth_ratio': options['auth_ratio'],
+            'concurrency': runner.concurrency,
+        })
+
+        self.stdout.write(f'{"маршрут":<22}{"p50":>9}{"p95":>9}{"p99":>9}'
+                          f'{"rps":>9}{"SQL":>7}{"ошибок":>8}')
+        for name, row in report.items():
+            queries = '-' if row['queries'] is None else row['queries']
+            self.stdout.write(
+                f'{name:<22}{row["p50_ms"]:>9}{row["p95_ms"]:>9}'
+                f'{row["p99_ms"]:>9}{row["rps"]:>9}{queries:>7}'
+                f'{row["errors"]:>8}')
+        self.stdout.write(f'Результаты сохранены в {path}')
+
+        if baseline_path is None:
+            return
+        with open(baseline_path) as file:
+            regressions = benchmark.compare(report, json.load(file),
+                                            options['threshold'])
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS(
+                f'Регрессий относительно {baseline_path} нет.'))
+            return
+        for regression in regressions:
+            self.stdout.write(self.style.WARNING(regression))
+        if options['fail_on_regression']:
+            raise CommandError(
+                f'Регрессий относительно {baseline_path}: '
+                f'{len(regressions)}.')
@@ -0,0 +1,120 @@
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.db.retry import is_locked
+from core.db.sqlite3.base import configure
+
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, likes_count INTEGER)',
+    'CREATE TABLE "like" (id INTEGER PRIMARY KEY, user_id INTEGER, '
+    'post_id INTEGER)',
+)
+POSTS = 100
+
+
+def like(connection, tuned, post_id):
+    """Транзакция лайка: прочитать пост, добавить лайк, нарастить счётчик."""
+    connection.execute('BEGIN IMMEDIATE' if tuned else 'BEGIN')
+    try:
+        connection.execute('SELECT likes_count FROM post WHERE id = ?',
+                           (post_id,))
+        connection.execute(
+            'INSERT INTO "like" (user_id, post_id) VALUES (?, ?)',
+            (os.getpid(), post_id))
+        connection.execute('UPDATE post SET likes_count = likes_count + 1 '
+                           'WHERE id = ?', (post_id,))
+        connection.execute('COMMIT')
+    except sqlite3.OperationalError:
+        connection.execute('ROLLBACK')
+        raise
+
+
+def write(path, tuned, writes, attempts, backoff):
+    """Пишет лайки, как запросы одного воркера; возвращает успехи и отказы.
+
+    Без настроек каждая запись открывает своё соединение (как без
+    CONN_MAX_AGE) и транзакцию BEGIN, которая сначала читает и только
+    потом пишет. С настройками соединение постоянное, прагмы как у
+    `core.db.sqlite3`, транзакции BEGIN IMMEDIATE с повтором.
+    """
+    done = failed = 0
+    connection = None
+    for _ in range(writes):
+        if connection is None:
+            connection = sqlite3.connect(path, timeout=5,
+                                         isolation_level=None)
+            if tuned:
+                configure(connection)
+        post_id = random.randint(1, POSTS)
+        for attempt in range(attempts if tuned else 1):
+            try:
+                like(connection, tuned, post_id)
+                done += 1
+                break
+            except sqlite3.OperationalError as error:
+                if not is_locked(error):
+                    raise
+                if attempt == attempts - 1 or not tuned:
+                    failed += 1
+                    break
+                time.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+        if not tuned:
+            connection.close()
+            connection = None
+    return done, failed
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность SQLite при конкурентной '
+            'записи со стандартными и с рабочими настройками.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8,
+                            help='Число параллельных процессов-писателей.')
+        parser.add_argument('--writes', type=int, default=200,
+                            help='Число транзакций на писателя.')
+
+    def run(self, tuned, writers, writes):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench.sqlite3')
+            connection = sqlite3.connect(path, isolation_level=None)
+            if tuned:
+                configure(connection)
+            for statement in SCHEMA:
+                connection.execute(statement)
+            connection.executemany(
+                'INSERT INTO post (id, likes_count) VALUES (?, 0)',
+                [(i,) for i in range(1, POSTS + 1)])
+            connection.close()
+            started = time.perf_counter()
+            with ProcessPoolExecutor(writers) as pool:
+                results = list(pool.map(
+                    write, [path] * writers, [tuned] * writers,
+                    [writes] * writers,
+                    [settings.SQLITE_RETRY_ATTEMPTS] * writers,
+                    [settings.SQLITE_RETRY_BACKOFF] * writers))
+            elapsed = time.perf_counter() - started
+        done = sum(result[0] for result in results)
+        failed = sum(result[1] for result in results)
+        return done, failed, elapsed
+
+    def handle(self, *args, **options):
+        throughput = {}
+        for name, tuned in (('по умолчанию', False), ('рабочие', True)):
+            done, failed, elapsed = self.run(tuned, options['writers'],
+                                             options['writes'])
+            throughput[tuned] = done / elapsed
+            self.stdout.write(
+                f'Настройки {name}: {done} транзакций за {elapsed:.2f} с, '
+                f'{throughput[tuned]:.0f} в секунду, '
+                f'ошибок блокировки: {failed}')
+        if throughput[False]:
+            self.stdout.write(self.style.SUCCESS(
+                f'Ускорение: {throughput[True] / throughput[False]:.1f}x'))
@@ -0,0 +1,77 @@
+import io
+import json
+import os
+import pstats
+from collections import defaultdict
+from statistics import median
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling import parse_name
+
+
+class Command(BaseCommand):
+    help = ('Сводит дампы профилировщика по представлениям: самые '
+            'горячие функции и места выделения памяти.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=None,
+                            help='Каталог дампов, по умолчанию '
+                                 'PROFILING_DIR.')
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--sort', default='cumulative',
+                            choices=('cumulative', 'tottime', 'ncalls'))
+        parser.add_argument('--view', help='Только это представление.')
+        parser.add_argument('--focus', default=r'thumbnail|loader_tags',
+                            help='Регулярное выражение для отдельного '
+                                 'списка функций; по умолчанию — миниатюры '
+                                 'и включаемые шаблоны.')
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or settings.PROFILING_DIR
+        if not os.path.isdir(directory):
+            raise CommandError(f'Каталога {directory} нет.')
+        dumps = defaultdict(list)
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.prof'):
+                view, elapsed = parse_name(name)
+                if options['view'] in (None, view):
+                    dumps[view].append((os.path.join(directory, name),
+                                        elapsed))
+        if not dumps:
+            raise CommandError(f'В {directory} нет подходящих дампов.')
+        for view, files in sorted(dumps.items()):
+            self.report(view, files, options)
+
+    def report(self, view, files, options):
+        latencies = [elapsed for _, elapsed in files]
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'{view}: дампов {len(files)}, медиана {median(latencies)} мс, '
+            f'максимум {max(latencies)} мс'))
+        # pstats печатает строку кусками, OutputWrapper добавил бы переводы.
+        stream = io.StringIO()
+        stats = pstats.Stats(*(path for path, _ in files), stream=stream)
+        stats.strip_dirs().sort_stats(options['sort'])
+        stats.print_stats(options['top'])
+        if options['focus']:
+            stream.write(f'Функции по «{options["focus"]}»:\n')
+            stats.print_stats(options['focus'], options['top'])
+        self.stdout.write(stream.getvalue())
+
+        sizes, counts = defaultdict(int), defaultdict(int)
+        for path, _ in files:
+            allocations = path[:-len('.prof')] + '.alloc.json'
+            if not os.path.exists(allocations):
+                continue
+            with open(allocations) as file:
+                for row in json.load(file):
+                    sizes[row['where']] += row['size']
+                    counts[row['where']] += row['count']
+        if sizes:
+            self.stdout.write('Память, суммарно по дампам:')
+            top = sorted(sizes, key=sizes.get, reverse=True)[:options['top']]
+            for where in top:
+                self.stdout.write(f'{sizes[where] / 1024:10.1f} КиБ '
+                                  f'{counts[where]:8} {where}')
+        self.stdout.write('')
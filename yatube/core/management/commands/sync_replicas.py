@@ -0,0 +1,23 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу в файлы реплик из '
+            'DATABASE_REPLICAS (онлайн-бэкап SQLite).')
+
+    def handle(self, *args, **options):
+        source = connections['default']
+        source.ensure_connection()
+        for alias in settings.DATABASE_REPLICAS:
+            target = sqlite3.connect(settings.DATABASES[alias]['NAME'])
+            try:
+                source.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(f'{alias}: скопирована')
+        self.stdout.write(self.style.SUCCESS(
+            f'Реплик обновлено: {len(settings.DATABASE_REPLICAS)}.'))
@@ -0,0 +1,207 @@
+"""Метрики приложения в текстовом формате Prometheus.
+
+Каждый процесс копит приращения счётчиков и гистограмм в памяти и раз
+в `METRICS_FLUSH_INTERVAL` секунд прибавляет их к общему файлу SQLite
+`METRICS_PATH`, как счётчики в core/cache.py. Страница `/metrics`
+сбрасывает приращения своего процесса и отдаёт сумму по всем воркерам,
+поэтому любой воркер отвечает одинаково, а перезапуск воркера не
+обнуляет значения.
+"""
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+
+SCHEMA = '''CREATE TABLE IF NOT EXISTS samples (
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (name, labels)
+) WITHOUT ROWID'''
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.pending = defaultdict(float)
+        self.pid = os.getpid()
+        self.flushed = time.monotonic()
+        self.local = threading.local()
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+
+    @property
+    def db(self):
+        local = self.local
+        key = os.getpid(), settings.METRICS_PATH
+        if getattr(local, 'key', None) != key:
+            db = sqlite3.connect(settings.METRICS_PATH, timeout=5,
+                                 isolation_level=None,
+                                 check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(SCHEMA)
+            local.db, local.key = db, key
+        return local.db
+
+    def forked(self):
+        """Приращения, унаследованные от родителя, сбросит сам родитель."""
+        if self.pid != os.getpid():
+            self.pending, self.pid = defaultdict(float), os.getpid()
+
+    def add(self, name, labels, amount):
+        with self.lock:
+            self.forked()
+            self.pending[name, labels] += amount
+            if (time.monotonic() - self.flushed
+                    < settings.METRICS_FLUSH_INTERVAL):
+                return
+        self.flush()
+
+    def flush(self):
+        with self.lock:
+            self.forked()
+            pending, self.pending = self.pending, defaultdict(float)
+            self.flushed = time.monotonic()
+        if not pending:
+            return
+        with self.db as db:
+            db.executemany(
+                'INSERT INTO samples (name, labels, value) VALUES (?, ?, ?) '
+                'ON CONFLICT (name, labels) DO UPDATE SET '
+                'value = value + excluded.value',
+                [(name, labels, amount)
+                 for (name, labels), amount in pending.items()])
+
+    def samples(self):
+        """Суммы по всем процессам: {имя: [(метки, значение)]}."""
+        self.flush()
+        samples = defaultdict(list)
+        for name, labels, value in self.db.execute(
+                'SELECT name, labels, value FROM samples '
+                'ORDER BY name, labels'):
+            samples[name].append((dict(json.loads(labels)), value))
+        return samples
+
+    def clear(self):
+        with self.lock:
+            self.pending.clear()
+        self.db.execute('DELETE FROM samples')
+
+    def exposition(self):
+        """Все метрики в текстовом формате Prometheus."""
+        samples = self.samples()
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            lines.extend(metric.render(samples))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+
+def escape(value):
+    return (str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+def sample_line(name, labels, value):
+    if labels:
+        pairs = ','.join(f'{key}="{escape(labels[key])}"'
+                         for key in sorted(labels))
+        name = f'{name}{{{pairs}}}'
+    value = int(value) if float(value).is_integer() else value
+    return f'{name} {value}'
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        registry.register(self)
+
+    def key(self, labels, **extra):
+        if set(labels) != set(self.labels):
+            raise ValueError(f'{self.name}: ожидались метки {self.labels}, '
+                             f'получены {tuple(labels)}.')
+        return json.dumps(sorted({**labels, **extra}.items()))
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        registry.add(self.name, self.key(labels), amount)
+
+    def render(self, samples):
+        for labels, value in samples.get(self.name, ()):
+            yield sample_line(self.name, labels, value)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=SECONDS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        index = bisect_left(self.buckets, value)
+        bound = (str(self.buckets[index]) if index < len(self.buckets)
+                 else '+Inf')
+        registry.add(f'{self.name}_bucket', self.key(labels, le=bound), 1)
+        registry.add(f'{self.name}_sum', self.key(labels), value)
+        registry.add(f'{self.name}_count', self.key(labels), 1)
+
+    def render(self, samples):
+        """Корзины хранятся раздельно, а отдаются накопительными."""
+        buckets = defaultdict(dict)
+        for labels, value in samples.get(f'{self.name}_bucket', ()):
+            bound = labels.pop('le')
+            buckets[json.dumps(sorted(labels.items()))][bound] = value
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        for key, counts in buckets.items():
+            labels, total = dict(json.loads(key)), 0
+            for bound in bounds:
+                total += counts.get(bound, 0)
+                yield sample_line(f'{self.name}_bucket',
+                                  {**labels, 'le': bound}, total)
+        for suffix in ('_sum', '_count'):
+            for labels, value in samples.get(self.name + suffix, ()):
+                yield sample_line(self.name + suffix, labels, value)
+
+
+objects_created = Counter(
+    'yatube_objects_created_total',
+    'Созданные посты, комментарии, лайки и подписки.', ('model',))
+request_duration = Histogram(
+    'yatube_request_duration_seconds',
+    'Время ответа по представлениям.', ('view',))
+cache_requests = Counter(
+    'yatube_cache_requests_total',
+    'Обращения к кэшам страниц лент и миниатюр.', ('cache', 'result'))
+db_connections = Counter(
+    'yatube_db_connections_opened_total',
+    'Открытые соединения с базой.', ('database',))
+db_lock_wait = Histogram(
+    'yatube_db_lock_wait_seconds',
+    'Ожидание блокировки записи в BEGIN IMMEDIATE.', ('database',),
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 20))
+db_lock_retries = Counter(
+    'yatube_db_lock_retries_total',
+    'Транзакции, повторённые из-за "database is locked".')
@@ -0,0 +1,90 @@
+"""Выборочное профилирование запросов: cProfile и tracemalloc.
+
+`ProfilingMiddleware` профилирует долю `PROFILING_SAMPLE_RATE` запросов
+и любой запрос сотрудника с заголовком `PROFILING_HEADER`. Для каждого
+пишется дамп pstats и самые крупные места выделения памяти; в имени
+файла — представление и время ответа. Свести дампы по представлениям
+можно командой `profile_report`.
+"""
+import cProfile
+import json
+import os
+import random
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+from django.conf import settings
+
+from .instrumentation import view_name
+
+# tracemalloc глобален для процесса: памятью занимается один запрос.
+_tracing = threading.Lock()
+
+TOP_ALLOCATIONS = 100
+
+
+def wanted(request):
+    if request.headers.get(settings.PROFILING_HEADER):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            return True
+    return random.random() < settings.PROFILING_SAMPLE_RATE
+
+
+def dump_name(view, elapsed):
+    """Имя файла: представление, время ответа, момент и процесс."""
+    return (f'{view.replace(":", ".")}_{elapsed * 1000:.0f}ms_'
+            f'{datetime.now():%Y%m%d-%H%M%S-%f}_{os.getpid()}')
+
+
+def parse_name(name):
+    """Представление и время ответа в мс из имени дампа."""
+    view, elapsed, _, _ = os.path.splitext(name)[0].rsplit('_', 3)
+    return view.replace('.', ':'), int(elapsed[:-2])
+
+
+def allocations(snapshot):
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+    ))
+    return [{'where': f'{stat.traceback[0].filename}:'
+                      f'{stat.traceback[0].lineno}',
+             'size': stat.size, 'count': stat.count}
+            for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]]
+
+
+class ProfilingMiddleware:
+    """Профилирует выборку запросов; ставится после аутентификации."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not wanted(request):
+            return self.get_response(request)
+        tracing = not tracemalloc.is_tracing() and _tracing.acquire(False)
+        if tracing:
+            tracemalloc.start()
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            response = profile.runcall(self.get_response, request)
+        finally:
+            elapsed = time.perf_counter() - started
+            snapshot = tracemalloc.take_snapshot() if tracing else None
+            if tracing:
+                tracemalloc.stop()
+                _tracing.release()
+        name = dump_name(view_name(request), elapsed)
+        os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+        path = os.path.join(settings.PROFILING_DIR, name)
+        profile.dump_stats(path + '.prof')
+        if snapshot is not None:
+            with open(path + '.alloc.json', 'w') as file:
+                json.dump(allocations(snapshot), file)
+        if request.headers.get(settings.PROFILING_HEADER):
+            response['X-Profile-Dump'] = name
+        return response
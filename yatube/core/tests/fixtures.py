@@ -0,0 +1,15 @@
+"""Фикстуры pytest для обоих наборов тестов: tests/ и тестов приложений."""
+import pytest
+
+from ..db.nplusone import detect
+
+
+@pytest.fixture(autouse=True)
+def nplusone(settings):
+    """Запрос к приложению с N+1 валит тест, см. core/db/nplusone.py.
+
+    Сама фикстура — контекст `detect` для кода вне запросов:
+    `with nplusone(threshold=5): ...`.
+    """
+    settings.NPLUSONE_MODE = 'raise'
+    return detect
@@ -0,0 +1,107 @@
+import json
+import os
+import random
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from posts.models import Group, Post
+
+from .. import benchmark
+
+User = get_user_model()
+
+
+def row(p95, queries):
+    return {'p50_ms': 1, 'p95_ms': p95, 'p99_ms': p95, 'rps': 1,
+            'requests': 1, 'errors': 0, 'queries': queries}
+
+
+class StatisticsTests(SimpleTestCase):
+    def test_percentile(self):
+        """Перцентиль по ближайшему рангу."""
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 0.5), 50)
+        self.assertEqual(benchmark.percentile(values, 0.99), 99)
+        self.assertEqual(benchmark.percentile([7], 0.95), 7)
+
+    def test_compare(self):
+        """Регрессия — рост p95 сверх порога или рост числа запросов."""
+        baseline = {'routes': {'a': row(10, 3), 'b': row(10, 3),
+                               'c': row(10, 3)}}
+        report = {'a': row(11.9, 3.4), 'b': row(12.1, 3), 'c': row(5, 4),
+                  'd': row(100, 100)}
+
+        regressions = benchmark.compare(report, baseline, 0.2)
+
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(regressions[0].startswith('b: p95'))
+        self.assertTrue(regressions[1].startswith('c: запросов'))
+
+
+class SampleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        authors = [User.objects.create_user(username=f'author{i}')
+                   for i in range(5)]
+        Post.objects.bulk_create(Post(author=authors[i % 5], text='Пост')
+                                 for i in range(30))
+
+    def test_reproducible_without_random_order(self):
+        """Выборка повторяется по зерну и не сортирует таблицы случайно."""
+        with CaptureQueriesContext(connection) as queries:
+            first = benchmark.Sample(10, random.Random(1))
+        second = benchmark.Sample(10, random.Random(1))
+
+        self.assertEqual(first.values, second.values)
+        self.assertEqual(len(first.values['post_id']), 10)
+        self.assertFalse([query for query in queries
+                          if 'RANDOM()' in query['sql']])
+
+
+class BenchmarkCommandTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='author')
+        group = Group.objects.create(title='Группа', slug='group')
+        Post.objects.create(author=author, group=group, text='Пост')
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def benchmark(self, **options):
+        return call_command('benchmark_http', requests=3, warmup=1,
+                            output_dir=self.directory, stdout=StringIO(),
+                            **options)
+
+    def test_report_saved_for_every_route(self):
+        """Все маршруты отвечают без ошибок, отчёт сохраняется в JSON."""
+        self.benchmark()
+
+        with open(benchmark.latest(self.directory)) as file:
+            report = json.load(file)
+        self.assertEqual(set(report['routes']),
+                         {route.name for route in benchmark.ROUTES})
+        for name, result in report['routes'].items():
+            with self.subTest(route=name):
+                self.assertEqual(result['requests'], 3)
+                self.assertEqual(result['errors'], 0)
+                self.assertIsNotNone(result['queries'])
+
+    def test_fails_on_regression(self):
+        """С --fail-on-regression регрессия завершает команду ошибкой."""
+        baseline = os.path.join(self.directory, 'baseline.json')
+        with open(baseline, 'w') as file:
+            json.dump({'routes': {'posts:index': row(0, 0)}}, file)
+
+        with self.assertRaises(CommandError):
+            self.benchmark(routes=['posts:index'], baseline=baseline,
+                           fail_on_regression=True)
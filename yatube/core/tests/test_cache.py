@@ -0,0 +1,120 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase
+
+from ..cache import LocalCache, SQLiteCache
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        options.setdefault('STATS_INTERVAL', 0)
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_set_get_delete(self):
+        """Значения сохраняются, читаются и удаляются."""
+        self.cache.set('key', {'value': 1})
+        self.cache.set_many({'a': 1, 'b': 2})
+
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c']),
+                         {'a': 1, 'b': 2})
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_timeout(self):
+        """Просроченные значения не читаются, а add их перезаписывает."""
+        self.cache.set('key', 'old', timeout=0.01)
+        time.sleep(0.02)
+
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'new'))
+        self.assertFalse(self.cache.add('key', 'newer'))
+        self.assertEqual(self.cache.get('key'), 'new')
+
+    def test_incr(self):
+        """incr атомарно увеличивает значение или сообщает об отсутствии."""
+        self.cache.set('counter', 1)
+
+        self.assertEqual(self.cache.incr('counter', 2), 3)
+        self.assertEqual(self.cache.get('counter'), 3)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_shared_between_instances(self):
+        """Экземпляры с одним файлом (как воркеры) видят общие данные."""
+        self.cache.set('key', 'value')
+
+        self.assertEqual(self.make_cache().get('key'), 'value')
+
+    def test_lru_eviction_by_bytes(self):
+        """Сверх бюджета вытесняются давно не читавшиеся записи."""
+        cache = self.make_cache(MAX_BYTES=3000, TOUCH_INTERVAL=0)
+        for i in range(3):
+            cache.set(f'key{i}', 'x' * 900)
+        cache.get('key0')
+        cache.set('key3', 'x' * 900)
+
+        self.assertIsNotNone(cache.get('key0'))
+        self.assertIsNone(cache.get('key1'))
+        stats = cache.stats()
+        self.assertLessEqual(stats['bytes'], 3000)
+        self.assertGreaterEqual(stats['evictions'], 1)
+
+    def test_stats(self):
+        """Попадания и промахи суммируются в общем файле."""
+        self.cache.set('key', 'value')
+        self.cache.get('key')
+        self.make_cache().get('missing')
+
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['entries'], 1)
+        self.assertEqual(stats['hit_ratio'], 0.5)
+
+
+class LocalCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.shared = LocMemCache('local-cache-tests', {})
+        self.shared.clear()
+        self.cache = LocalCache(self.shared, max_entries=2, timeout=60)
+
+    def test_reads_served_from_memory(self):
+        """Повторное чтение не обращается к общему кэшу."""
+        self.cache.set('key', 'value')
+        self.shared.delete('key')
+
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertIsNone(self.cache.get_shared('key'))
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_bounded_lru(self):
+        """В памяти остаются только последние использованные ключи."""
+        for key in ('a', 'b'):
+            self.cache.set(key, key)
+        self.cache.get('a')
+        self.cache.set('c', 'c')
+        self.shared.clear()
+
+        self.assertEqual(self.cache.get('a'), 'a')
+        self.assertEqual(self.cache.get('c'), 'c')
+        self.assertIsNone(self.cache.get('b'))
+
+    def test_timeout(self):
+        """По истечении TTL значение перечитывается из общего кэша."""
+        cache = LocalCache(self.shared, timeout=0)
+        cache.set('key', 'old')
+        self.shared.set('key', 'new')
+
+        self.assertEqual(cache.get('key'), 'new')
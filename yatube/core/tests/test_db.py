@@ -0,0 +1,117 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from ..db.retry import atomic_retry
+from ..db.sqlite3.base import PRAGMAS, configure
+
+
+class ConnectionSetupTests(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied(self):
+        """Прагмы применяются к каждому соединению Django."""
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('cache_size'), PRAGMAS['cache_size'])
+        self.assertEqual(self.pragma('temp_store'), 2)
+
+    def test_wal_on_file_database(self):
+        """На файле базы включается журнал WAL."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        db = sqlite3.connect(os.path.join(directory, 'db.sqlite3'))
+        configure(db)
+
+        self.assertEqual(db.execute('PRAGMA journal_mode').fetchone()[0],
+                         'wal')
+        db.close()
+
+
+class ImmediateTransactionTests(TransactionTestCase):
+    def test_atomic_takes_write_lock_at_begin(self):
+        """atomic() открывает транзакцию через BEGIN IMMEDIATE."""
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                pass
+        self.assertEqual(queries[0]['sql'], 'BEGIN IMMEDIATE')
+
+
+class AtomicRetryTests(SimpleTestCase):
+    databases = {'default'}
+
+    def setUp(self):
+        patcher = mock.patch('core.db.retry.time.sleep')
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+        # Без разброса пауза растёт строго, а не в среднем.
+        jitter = mock.patch('core.db.retry.random.uniform', return_value=1)
+        jitter.start()
+        self.addCleanup(jitter.stop)
+
+    def flaky(self, failures, error='database is locked'):
+        calls = []
+
+        @atomic_retry
+        def write():
+            calls.append(connection.in_atomic_block)
+            if len(calls) <= failures:
+                raise OperationalError(error)
+            return 'ok'
+        return write, calls
+
+    def test_retries_locked_transaction(self):
+        """Заблокированная транзакция повторяется с растущей паузой."""
+        write, calls = self.flaky(2)
+
+        self.assertEqual(write(), 'ok')
+        self.assertEqual(calls, [True] * 3)
+        first, second = (call.args[0] for call in self.sleep.call_args_list)
+        self.assertGreater(second, first)
+
+    def test_gives_up_after_attempts(self):
+        """После SQLITE_RETRY_ATTEMPTS попыток ошибка пробрасывается."""
+        write, calls = self.flaky(100)
+
+        with self.settings(SQLITE_RETRY_ATTEMPTS=3):
+            with self.assertRaises(OperationalError):
+                write()
+        self.assertEqual(len(calls), 3)
+
+    def test_other_errors_not_retried(self):
+        """Прочие ошибки базы не повторяются."""
+        write, calls = self.flaky(1, error='no such table: missing')
+
+        with self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(calls), 1)
+
+    def test_not_retried_inside_transaction(self):
+        """Внутри внешней транзакции повтор невозможен."""
+        write, calls = self.flaky(1)
+
+        with self.assertRaises(OperationalError):
+            with transaction.atomic():
+                write()
+        self.assertEqual(len(calls), 1)
+
+
+class BenchmarkCommandTests(SimpleTestCase):
+    def test_benchmark_reports_both_modes(self):
+        """Команда benchmark_sqlite сравнивает оба режима."""
+        out = StringIO()
+
+        call_command('benchmark_sqlite', writers=2, writes=5, stdout=out)
+
+        self.assertIn('по умолчанию', out.getvalue())
+        self.assertIn('рабочие: 10 транзакций', out.getvalue())
@@ -0,0 +1,124 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+from ..instrumentation import Histogram, registry
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C\x0A\x00\x3B')
+
+
+class HistogramTests(SimpleTestCase):
+    def test_cumulative_buckets(self):
+        """Корзины накопительные, значение на границе входит в корзину."""
+        histogram = Histogram((1, 10, float('inf')))
+        for value in (0.5, 1, 5, 50):
+            histogram.observe(value)
+
+        self.assertEqual(histogram.as_dict(), {
+            'count': 4, 'sum': 56.5,
+            'buckets': {'1': 2, '10': 3, '+Inf': 4}})
+
+
+class InstrumentationMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        registry.clear()
+        self.addCleanup(registry.clear)
+
+    def test_request_measured_by_view_name(self):
+        """Запрос учитывается под именем представления."""
+        response = self.client.get(reverse('posts:index'))
+
+        stats = registry.snapshot()['posts:index']
+        self.assertEqual(stats['queries']['count'], 1)
+        self.assertGreater(stats['queries']['sum'], 0)
+        self.assertGreater(stats['db_ms']['sum'], 0)
+        self.assertGreater(stats['template_ms']['sum'], 0)
+        self.assertGreaterEqual(stats['total_ms']['sum'],
+                                stats['template_ms']['sum'])
+        self.assertEqual(stats['response_bytes']['sum'],
+                         len(response.content))
+
+    def test_unresolved_path(self):
+        """Неизвестный адрес учитывается отдельно."""
+        self.client.get('/no/such/page/')
+
+        self.assertIn('<unresolved>', registry.snapshot())
+
+    def test_stats_only_for_staff(self):
+        """Страница замеров открыта только сотрудникам."""
+        url = reverse('core:request_stats')
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.force_login(self.author)
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.force_login(self.staff)
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('posts:index', response.json())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ServerTimingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.addClassCleanup(shutil.rmtree, TEMP_MEDIA_ROOT,
+                            ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.post = Post.objects.create(
+            author=User.objects.create_user(username='author'), text='Пост',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'))
+
+    def setUp(self):
+        cache.clear()
+
+    def timings(self, url):
+        header = self.client.get(url)['Server-Timing']
+        return {metric.split(';')[0]: float(metric.split('dur=')[1].split(
+            ';')[0]) for metric in header.split(', ')}
+
+    def test_phases_reported(self):
+        """Ответ posts содержит фазы db, thumbnail, template и total."""
+        timings = self.timings(reverse('posts:post_detail',
+                                       args=(self.post.pk,)))
+
+        self.assertEqual(set(timings),
+                         {'db', 'thumbnail', 'template', 'total'})
+        self.assertGreater(timings['thumbnail'], 0)
+        self.assertGreaterEqual(timings['total'], timings['template'])
+
+    def test_users_views_reported(self):
+        """Ответы users тоже получают заголовок."""
+        self.assertIn('total', self.timings(reverse('users:signup')))
+
+    def test_other_apps_skipped(self):
+        """Остальные представления заголовок не получают."""
+        response = self.client.get(reverse('about:author'))
+
+        self.assertNotIn('Server-Timing', response)
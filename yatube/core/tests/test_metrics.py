@@ -0,0 +1,106 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+from .. import metrics
+
+User = get_user_model()
+
+
+class MetricsTestMixin:
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        metrics_settings = override_settings(
+            METRICS_PATH=os.path.join(directory, 'metrics.sqlite3'))
+        metrics_settings.enable()
+        self.addCleanup(metrics_settings.disable)
+        metrics.registry.clear()
+
+
+def increment():
+    metrics.db_lock_retries.inc(2)
+    metrics.registry.flush()
+
+
+class RegistryTests(MetricsTestMixin, TestCase):
+    def test_histogram_exposition(self):
+        """Корзины гистограммы отдаются накопительными."""
+        for seconds in (0.003, 0.02, 0.02, 30):
+            metrics.request_duration.observe(seconds, view='posts:index')
+
+        text = metrics.registry.exposition()
+
+        self.assertIn('# TYPE yatube_request_duration_seconds histogram',
+                      text)
+        for line in (
+            'yatube_request_duration_seconds_bucket'
+            '{le="0.005",view="posts:index"} 1',
+            'yatube_request_duration_seconds_bucket'
+            '{le="0.025",view="posts:index"} 3',
+            'yatube_request_duration_seconds_bucket'
+            '{le="10",view="posts:index"} 3',
+            'yatube_request_duration_seconds_bucket'
+            '{le="+Inf",view="posts:index"} 4',
+            'yatube_request_duration_seconds_count{view="posts:index"} 4',
+        ):
+            self.assertIn(line + '\n', text)
+
+    def test_wrong_labels(self):
+        """Метки должны совпадать с объявленными."""
+        with self.assertRaises(ValueError):
+            metrics.cache_requests.inc(cache='thumbnail')
+
+    def test_processes_summed(self):
+        """Значения разных процессов складываются в общем файле."""
+        metrics.db_lock_retries.inc()
+        process = multiprocessing.get_context('fork').Process(
+            target=increment)
+        process.start()
+        process.join()
+
+        self.assertIn('yatube_db_lock_retries_total 3\n',
+                      metrics.registry.exposition())
+
+
+class MetricsViewTests(MetricsTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_app_metrics(self):
+        """Страница отдаёт созданные объекты, задержки и кэш лент."""
+        Post.objects.create(
+            author=User.objects.create_user(username='author'), text='Пост')
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+
+        response = self.client.get(reverse('core:metrics'))
+
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        text = response.content.decode()
+        for line in (
+            'yatube_objects_created_total{model="post"} 1',
+            'yatube_cache_requests_total'
+            '{cache="index_page",result="hit"} 1',
+            'yatube_cache_requests_total'
+            '{cache="index_page",result="miss"} 1',
+            'yatube_request_duration_seconds_count{view="posts:index"} 2',
+        ):
+            self.assertIn(line + '\n', text)
+
+    def test_hidden_from_other_addresses(self):
+        """С чужого адреса без входа страница не видна."""
+        response = self.client.get(reverse('core:metrics'),
+                                   REMOTE_ADDR='192.0.2.1')
+
+        self.assertEqual(response.status_code, 404)
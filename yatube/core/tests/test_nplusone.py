@@ -0,0 +1,66 @@
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.template import engines
+from django.test import RequestFactory, TestCase, override_settings
+
+from posts.models import Post
+
+from ..db.nplusone import NPlusOneError, NPlusOneMiddleware, detect
+
+User = get_user_model()
+
+
+class NPlusOneTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(3):
+            Post.objects.create(
+                author=User.objects.create_user(username=f'author{i}'),
+                text='Пост')
+
+    def test_code_location_reported(self):
+        """Автор каждого поста отдельным запросом — N+1 из этого файла."""
+        with self.assertRaisesMessage(NPlusOneError,
+                                      'core/tests/test_nplusone.py'):
+            with detect():
+                for post in Post.objects.all():
+                    post.author.username
+
+    def test_template_line_reported(self):
+        """Запрос из шаблона указывает на строку и выражение."""
+        template = engines['django'].from_string(
+            '{% for post in posts %}\n{{ post.author.username }}\n'
+            '{% endfor %}')
+
+        with self.assertRaisesMessage(NPlusOneError,
+                                      ':2 (post.author.username)'):
+            with detect():
+                template.render({'posts': Post.objects.all()})
+
+    def test_select_related_passes(self):
+        """С select_related и повторами тех же параметров N+1 нет."""
+        with detect():
+            for post in Post.objects.select_related('author'):
+                post.author.username
+            for _ in range(3):
+                Post.objects.filter(pk=1).first()
+
+    def test_ignore_and_warn(self):
+        """Формы из списка исключений не считаются, warn не бросает."""
+        with detect(ignore=[r'FROM "auth_user"']):
+            for post in Post.objects.all():
+                post.author.username
+        with self.assertWarns(UserWarning):
+            with detect('warn'):
+                for post in Post.objects.all():
+                    post.author.username
+
+    @override_settings(NPLUSONE_MODE='raise')
+    def test_middleware(self):
+        """В режиме raise запрос с N+1 завершается исключением."""
+        def view(request):
+            return HttpResponse(', '.join(
+                post.author.username for post in Post.objects.all()))
+
+        with self.assertRaises(NPlusOneError):
+            NPlusOneMiddleware(view)(RequestFactory().get('/'))
@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+from ..profiling import dump_name, parse_name
+
+User = get_user_model()
+
+
+class DumpNameTests(SimpleTestCase):
+    def test_round_trip(self):
+        """Из имени дампа читаются представление и время ответа."""
+        name = dump_name('posts:post_detail', 0.1234) + '.prof'
+
+        self.assertEqual(parse_name(name), ('posts:post_detail', 123))
+
+
+class ProfilingMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        profiling_settings = override_settings(PROFILING_DIR=self.directory)
+        profiling_settings.enable()
+        self.addCleanup(profiling_settings.disable)
+
+    def dumps(self):
+        return sorted(os.listdir(self.directory))
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_sampled_request_dumped(self):
+        """Попавший в выборку запрос оставляет профиль и память."""
+        self.client.get(reverse('posts:index'))
+
+        alloc, prof = self.dumps()
+        self.assertTrue(prof.startswith('posts.index_'))
+        self.assertTrue(prof.endswith('.prof'))
+        self.assertEqual(alloc, prof.replace('.prof', '.alloc.json'))
+
+    def test_header_only_for_staff(self):
+        """Заголовок включает профилирование только для сотрудников."""
+        url = reverse('posts:index')
+        self.client.force_login(self.author)
+        response = self.client.get(url, HTTP_X_PROFILE='1')
+        self.assertEqual(self.dumps(), [])
+        self.assertNotIn('X-Profile-Dump', response)
+
+        self.client.force_login(self.staff)
+        response = self.client.get(url, HTTP_X_PROFILE='1')
+        self.assertIn(response['X-Profile-Dump'] + '.prof', self.dumps())
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_report(self):
+        """profile_report сводит дампы по представлениям."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        out = StringIO()
+
+        call_command('profile_report', dir=self.directory, stdout=out)
+
+        self.assertIn('posts:index: дампов 2', out.getvalue())
+        self.assertIn('(index)', out.getvalue())
+        self.assertIn('Память', out.getvalue())
@@ -0,0 +1,144 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TransactionTestCase,
+                         override_settings)
+
+from posts.models import Post
+
+from ..db import replicas
+from ..db.retry import atomic_retry
+from ..db.routers import ReplicaRouter
+
+User = get_user_model()
+
+
+class ReplicaTestMixin:
+    databases = {'default'}
+
+    def setUp(self):
+        super().setUp()
+        self.router = ReplicaRouter()
+        replica_settings = override_settings(DATABASE_REPLICAS=['replica1'])
+        replica_settings.enable()
+        self.addCleanup(replica_settings.disable)
+        patcher = mock.patch('core.db.routers.connections', {
+            alias: SimpleNamespace(settings_dict={'NAME': f'{alias}.sqlite3'})
+            for alias in ('default', 'sessions', 'replica1')})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class ReplicaRouterTests(ReplicaTestMixin, SimpleTestCase):
+    def test_reads_go_to_replica_only_when_allowed(self):
+        """С реплик читается только внутри разрешённого запроса."""
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+        with replicas.use_replicas():
+            self.assertEqual(self.router.db_for_read(Post), 'replica1')
+            with replicas.use_primary():
+                self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_writes_go_to_primary(self):
+        """Запись идёт в default и отмечается."""
+        with replicas.use_replicas() as state:
+            self.assertEqual(self.router.db_for_write(Post), 'default')
+            self.assertTrue(state.written)
+
+    def test_separate_apps_left_to_app_router(self):
+        """Сессии не читаются с реплик."""
+        with replicas.use_replicas():
+            self.assertIsNone(self.router.db_for_read(Session))
+            self.assertIsNone(self.router.db_for_write(Session))
+
+    def test_relations_and_migrations(self):
+        """Объекты с реплики связываются с объектами из default,
+        а миграции на реплики не применяются."""
+        primary, replica = Post(), Post()
+        replica._state.db = 'replica1'
+        primary._state.db = 'default'
+
+        self.assertTrue(self.router.allow_relation(primary, replica))
+        self.assertFalse(self.router.allow_migrate('replica1', 'posts'))
+        self.assertIsNone(self.router.allow_migrate('default', 'posts'))
+
+    def test_transactions_read_primary(self):
+        """Внутри atomic_retry чтение идёт в основную базу."""
+        @atomic_retry
+        def write():
+            return self.router.db_for_read(Post)
+
+        with replicas.use_replicas():
+            self.assertEqual(write(), 'default')
+
+
+class ReplicaMiddlewareTests(ReplicaTestMixin, SimpleTestCase):
+    def request(self, method='get', write=False, cookie=None):
+        reads = []
+
+        def view(request):
+            reads.append(self.router.db_for_read(Post))
+            if write:
+                self.router.db_for_write(Post)
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)('/')
+        if cookie is not None:
+            request.COOKIES[replicas.PRIMARY_COOKIE] = cookie
+        response = replicas.ReplicaMiddleware(view)(request)
+        return reads[0], response
+
+    def test_safe_request_reads_replica(self):
+        """GET читает реплику и не привязывает клиента."""
+        db, response = self.request()
+
+        self.assertEqual(db, 'replica1')
+        self.assertNotIn(replicas.PRIMARY_COOKIE, response.cookies)
+
+    def test_write_pins_client_to_primary(self):
+        """После записи клиент на время отставания читает default."""
+        db, response = self.request('post', write=True)
+
+        self.assertEqual(db, 'default')
+        cookie = response.cookies[replicas.PRIMARY_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.DATABASE_REPLICA_LAG)
+
+        db, _ = self.request(cookie=cookie.value)
+        self.assertEqual(db, 'default')
+
+    def test_expired_or_broken_cookie_ignored(self):
+        """Истёкшая или испорченная отметка не мешает читать реплику."""
+        for cookie in (str(time.time() - 1), 'garbage'):
+            with self.subTest(cookie=cookie):
+                self.assertEqual(self.request(cookie=cookie)[0], 'replica1')
+
+
+class SyncReplicasTests(TransactionTestCase):
+    def test_replica_is_copy_of_primary(self):
+        """sync_replicas копирует основную базу в файлы реплик."""
+        Post.objects.create(
+            author=User.objects.create_user(username='author'), text='Пост')
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'replica1.sqlite3')
+        replica_settings = {**settings.DATABASES['default'], 'NAME': path}
+
+        with mock.patch.dict(settings.DATABASES, replica1=replica_settings), \
+                override_settings(DATABASE_REPLICAS=['replica1']):
+            call_command('sync_replicas', stdout=StringIO())
+
+        replica = sqlite3.connect(path)
+        self.addCleanup(replica.close)
+        self.assertEqual(
+            replica.execute('SELECT text FROM posts_post').fetchall(),
+            [('Пост',)])
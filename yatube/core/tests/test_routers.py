@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.sessions.models import Session
+from django.db import router
+from django.test import SimpleTestCase
+
+from posts.models import Post
+
+from ..db.routers import AppRouter
+
+
+def databases(**names):
+    return {alias: SimpleNamespace(settings_dict={'NAME': name})
+            for alias, name in names.items()}
+
+
+class AppRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = AppRouter()
+        patcher = mock.patch('core.db.routers.connections', databases(
+            default='db.sqlite3', sessions='sessions.sqlite3'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_sessions_in_own_database(self):
+        """Сессии читаются и пишутся в отдельный файл, посты — в default."""
+        self.assertEqual(self.router.db_for_write(Session), 'sessions')
+        self.assertEqual(self.router.db_for_read(Session), 'sessions')
+        self.assertIsNone(self.router.db_for_write(Post))
+
+    def test_same_file_falls_back_to_default(self):
+        """Алиас на тот же файл, что и default, не используется."""
+        with mock.patch('core.db.routers.connections', databases(
+                default='db.sqlite3', sessions='db.sqlite3')):
+            self.assertIsNone(self.router.db_for_write(Session))
+
+    def test_allow_migrate(self):
+        """В отдельном файле создаются только таблицы его приложений."""
+        self.assertTrue(self.router.allow_migrate('sessions', 'sessions'))
+        self.assertTrue(self.router.allow_migrate('default', 'sessions'))
+        self.assertTrue(self.router.allow_migrate('default', 'posts'))
+        self.assertFalse(self.router.allow_migrate('sessions', 'posts'))
+
+    def test_no_relations_across_databases(self):
+        """Связи между объектами из разных файлов запрещены."""
+        session, post = Session(), Post()
+        self.assertFalse(self.router.allow_relation(session, post))
+        self.assertIsNone(self.router.allow_relation(post, Post()))
+
+
+class TestMirrorTests(SimpleTestCase):
+    def test_sessions_use_default_in_tests(self):
+        """В тестах база сессий — зеркало default."""
+        self.assertEqual(router.db_for_write(Session), 'default')
@@ -0,0 +1,105 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+from ..db import slowlog
+
+User = get_user_model()
+
+
+class NormalizeTests(SimpleTestCase):
+    def test_literals_and_in_lists(self):
+        """Литералы и списки IN любой длины не меняют отпечаток."""
+        self.assertEqual(
+            slowlog.normalize("SELECT * FROM t0 WHERE a IN (%s, %s)\n"
+                              "AND b = 'x' LIMIT 20"),
+            'SELECT * FROM t0 WHERE a IN (...) AND b = ? LIMIT ?')
+        self.assertEqual(
+            slowlog.fingerprint('SELECT 1 FROM t WHERE id IN (%s)'),
+            slowlog.fingerprint('SELECT 2 FROM t WHERE id IN (%s, %s, %s)'))
+
+
+class SlowQueryLogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Post.objects.create(
+            author=User.objects.create_user(username='author'), text='Пост')
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_entry_has_view_frame_and_plan(self):
+        """Запись содержит представление, место вызова и план."""
+        with self.assertLogs('core.slow_queries') as logs:
+            self.client.get(reverse('posts:index'))
+
+        entries = [json.loads(record.getMessage())
+                   for record in logs.records]
+        posts = [entry for entry in entries
+                 if 'FROM "posts_post"' in entry['sql']]
+        self.assertTrue(posts)
+        entry = posts[0]
+        self.assertEqual(entry['view'], 'posts:index')
+        self.assertTrue(entry['frame'].startswith('posts'))
+        self.assertTrue(entry['plan'])
+        self.assertEqual(entry['fingerprint'],
+                         slowlog.fingerprint(entry['sql']))
+
+    @override_settings(SLOW_QUERY_MS=None)
+    def test_disabled(self):
+        """Без порога журнал не пишется."""
+        with self.assertNoLogs('core.slow_queries'):
+            self.client.get(reverse('posts:index'))
+
+
+class SlowQueriesAdminTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.log = os.path.join(directory, 'slow.log')
+        log_settings = override_settings(SLOW_QUERY_LOG=self.log)
+        log_settings.enable()
+        self.addCleanup(log_settings.disable)
+        self.client.force_login(User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'))
+
+    def write(self, path, *entries):
+        with open(path, 'w', encoding='utf-8') as file:
+            for sql, ms, view in entries:
+                file.write(json.dumps({
+                    'sql': sql, 'ms': ms, 'view': view, 'params': [],
+                    'frame': None, 'plan': ['SCAN t'],
+                    'fingerprint': slowlog.fingerprint(sql)}) + '\n')
+
+    def test_grouped_by_fingerprint(self):
+        """Страница группирует записи, включая ротированные файлы."""
+        self.write(self.log + '.1',
+                   ('SELECT * FROM t WHERE id IN (%s)', 150, 'posts:index'))
+        self.write(self.log,
+                   ('SELECT * FROM t WHERE id IN (%s, %s)', 250,
+                    'posts:index'),
+                   ('SELECT * FROM u', 120, None))
+
+        response = self.client.get(reverse('admin:slow_queries'))
+
+        groups = response.context['groups']
+        self.assertEqual([group['count'] for group in groups], [2, 1])
+        self.assertEqual(groups[0]['total_ms'], 400)
+        self.assertEqual(groups[0]['max_ms'], 250)
+        self.assertEqual(groups[0]['views'], [('posts:index', 2)])
+        self.assertContains(response, 'SCAN t')
+
+    def test_linked_from_index(self):
+        """На главной админки есть ссылка на отчёт."""
+        response = self.client.get(reverse('admin:index'))
+
+        self.assertContains(response, reverse('admin:slow_queries'))
@@ -0,0 +1,28 @@
+import threading
+
+from sorl.thumbnail import base
+
+from . import metrics
+from .instrumentation import phase
+
+
+class ThumbnailBackend(base.ThumbnailBackend):
+    """Бэкенд sorl-thumbnail, который замеряет получение миниатюр
+    и считает попадания в кэш (миниатюру не пришлось строить)."""
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        self.local.created = False
+        with phase('thumbnail'):
+            thumbnail = super().get_thumbnail(file_, geometry_string,
+                                              **options)
+        metrics.cache_requests.inc(
+            cache='thumbnail',
+            result='miss' if self.local.created else 'hit')
+        return thumbnail
+
+    def _create_thumbnail(self, *args, **kwargs):
+        self.local.created = True
+        return super()._create_thumbnail(*args, **kwargs)
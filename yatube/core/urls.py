@@ -0,0 +1,9 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'core'
+urlpatterns = [
+    path('stats/requests/', views.request_stats, name='request_stats'),
+    path('metrics', views.metrics, name='metrics'),
+]
@@ -1,5 +1,11 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import render
 
+from . import metrics as app_metrics
+from .instrumentation import registry
+
 
 def bad_request(request, exception):
     return render(request, 'core/400.html', {'path': request.path}, status=400)
@@ -19,3 +25,21 @@ def page_not_found(request, exception):
 
 def server_error(request):
     return render(request, 'core/500.html', {'path': request.path}, status=500)
+
+
+@staff_member_required
+def request_stats(request):
+    """Гистограммы замеров запросов этого процесса по представлениям."""
+    return JsonResponse(registry.snapshot(),
+                        json_dumps_params={'ensure_ascii': False})
+
+
+def metrics(request):
+    """Метрики всех процессов для Prometheus; открыты доверенным адресам
+    и сотрудникам."""
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS \
+            and not request.user.is_staff:
+        raise Http404
+    return HttpResponse(app_metrics.registry.exposition(),
+                        content_type='text/plain; version=0.0.4; '
+                                     'charset=utf-8')
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from . import search
 from .models import Comment, Follow, Group, Post
 
 
@@ -11,6 +12,13 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Ищет по полнотекстовому индексу вместо LIKE по тексту."""
+        match = search.match_query(search_term)
+        if match is None:
+            return queryset, False
+        return queryset.filter(pk__in=search.matching_ids(match)), False
+
 
 admin.site.register(Group)
 admin.site.register(Follow)
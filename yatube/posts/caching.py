@@ -0,0 +1,257 @@
+import hashlib
+import math
+import random
+import sys
+import time
+from collections import namedtuple
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import (get_cache_key, get_conditional_response,
+                                has_vary_header, learn_cache_key,
+                                patch_vary_headers)
+from django.utils.http import http_date
+
+from core import metrics
+from core.cache import LocalCache
+from core.db.replicas import use_primary
+
+GENERATION_KEY = 'feed_generation:{}'
+
+# Страницы и списки заголовков Vary: сначала память процесса, потом общий
+# кэш. Поколения всегда читаются из общего кэша, поэтому сдвиг поколения
+# в любом процессе сразу делает чужие копии в памяти устаревшими.
+pages = LocalCache(cache, settings.FEED_LOCAL_CACHE_ENTRIES,
+                   settings.FEED_LOCAL_CACHE_TIMEOUT)
+
+
+def index_scope():
+    return 'index'
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def author_scope(username):
+    return f'author:{username}'
+
+
+def post_scopes(post, group_slug=None):
+    """Ленты и страницы, в которых показывается пост."""
+    scopes = {index_scope(), author_scope(post.author.username),
+              post_scope(post.pk)}
+    if post.group_id:
+        scopes.add(group_scope(post.group.slug))
+    if group_slug:
+        scopes.add(group_scope(group_slug))
+    return scopes
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def generations(scopes):
+    """Текущие поколения лент; отсутствующие заводятся заново.
+
+    Поколение — время последнего изменения в наносекундах. Поэтому после
+    вытеснения ключа из кэша номер не повторится, а по поколениям можно
+    отдавать Last-Modified.
+    """
+    keys = [GENERATION_KEY.format(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def bump(scopes):
+    """Сдвигает поколения лент, после чего их страницы не читаются."""
+    keys = [GENERATION_KEY.format(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    now = time.time_ns()
+    cache.set_many({key: max(now, found.get(key, 0) + 1) for key in keys},
+                   None)
+
+
+def bump_on_commit(scopes):
+    """Сдвигает поколения после фиксации текущей транзакции."""
+    scopes = set(scopes)
+    transaction.on_commit(lambda: bump(scopes))
+
+
+CachedPage = namedtuple('CachedPage',
+                        ('response', 'generations', 'expires', 'delta'))
+
+
+def _acquire(key):
+    """Берёт короткую блокировку на пересчёт страницы."""
+    return cache.add(f'{key}:lock', True, settings.FEED_CACHE_LOCK_TIMEOUT)
+
+
+def _release(key):
+    cache.delete(f'{key}:lock')
+
+
+def _is_fresh(page, current):
+    """Страница актуальна, если поколения не менялись и срок не истёк.
+
+    Срок проверяется с вероятностным упреждением (XFetch): чем ближе
+    истечение и чем дольше считается страница, тем вероятнее, что один
+    из запросов пересчитает её заранее.
+    """
+    if page.generations != current:
+        return False
+    early = page.delta * settings.FEED_CACHE_EARLY_BETA * math.log(
+        random.random() or sys.float_info.min)
+    return time.time() - early < page.expires
+
+
+def _copy(response):
+    """Свой объект ответа на запрос: middleware меняют заголовки."""
+    fresh = HttpResponse(response.content, status=response.status_code)
+    for header, value in response.items():
+        fresh[header] = value
+    return fresh
+
+
+def _should_cache(request, response):
+    if response.streaming or response.status_code != 200:
+        return False
+    if has_vary_header(response, 'Cookie') and request.COOKIES and (
+            response.cookies):
+        return False
+    return 'private' not in response.get('Cache-Control', ())
+
+
+def _request_generations(request, scopes):
+    """Поколения, прочитанные один раз на запрос для всех декораторов."""
+    known = request.__dict__.setdefault('_feed_generations', {})
+    key = tuple(scopes)
+    if key not in known:
+        known[key] = generations(scopes)
+    return known[key]
+
+
+def _reads(current):
+    """Основная база, если ленты менялись позже допустимого отставания
+    реплик: иначе устаревшая копия закэшировалась бы с новым поколением.
+    """
+    age = time.time_ns() - max(current)
+    if age < settings.DATABASE_REPLICA_LAG * 10 ** 9:
+        return use_primary()
+    return nullcontext()
+
+
+def _validators(request, current):
+    """ETag и Last-Modified страницы для поколений и зрителя."""
+    viewer = request.user.pk if request.user.is_authenticated else ''
+    etag = hashlib.md5(
+        f'{viewer}:{request.get_full_path()}:{current}'.encode()
+    ).hexdigest()
+    last_modified = datetime.fromtimestamp(max(current) / 10 ** 9,
+                                           tz=timezone.utc)
+    return f'"{etag}"', last_modified
+
+
+def _with_validators(response, request, current):
+    """Добавляет валидаторы и Vary: Cookie к свежему ответу представления."""
+    if response.status_code == 200 and not response.has_header('ETag'):
+        etag, last_modified = _validators(request, current)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # SessionMiddleware добавит Vary: Cookie уже после кэширования,
+    # а ключ должен учитывать его сейчас.
+    if getattr(request, 'session', None) is not None and (
+            request.session.accessed):
+        patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def condition_feed(scopes):
+    """Отвечает 304 Not Modified, пока поколения и зритель те же.
+
+    Проверка стоит нескольких чтений кэша: ни шаблоны, ни запросы
+    страницы не выполняются. Без областей (например, для несуществующего
+    объекта) представление вызывается как есть.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            view_scopes = scopes(*args, **kwargs)
+            if not view_scopes:
+                return view(request, *args, **kwargs)
+            current = _request_generations(request, view_scopes)
+            etag, last_modified = _validators(request, current)
+            response = get_conditional_response(
+                request, etag=etag,
+                last_modified=int(last_modified.timestamp()))
+            if response is None:
+                with _reads(current):
+                    response = view(request, *args, **kwargs)
+                response = _with_validators(response, request, current)
+            return response
+        return wrapper
+    return decorator
+
+
+def cache_feed(scopes, timeout=None):
+    """Кэширует страницу ленты до смены поколения её областей.
+
+    `scopes` получает аргументы представления и возвращает области,
+    от которых зависит страница. Ключ кэша строится как у `cache_page`
+    (с учётом URL и заголовков Vary). Устаревшую страницу пересчитывает
+    один запрос под блокировкой, остальные тем временем получают
+    прежнюю копию.
+    """
+    def decorator(view):
+        cache_name = f'{view.__name__}_page'
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            view_scopes = scopes(*args, **kwargs)
+            current = _request_generations(request, view_scopes)
+            prefix = 'feed:' + ':'.join(view_scopes)
+            key = get_cache_key(request, prefix, 'GET', cache=pages)
+            page = pages.get(key) if key else None
+            if page is not None and page.generations != current:
+                page = pages.get_shared(key)
+            if page is not None and (_is_fresh(page, current)
+                                     or not _acquire(key)):
+                metrics.cache_requests.inc(cache=cache_name, result='hit')
+                return _copy(page.response)
+            metrics.cache_requests.inc(cache=cache_name, result='miss')
+            started = time.time()
+            try:
+                with _reads(current):
+                    response = view(request, *args, **kwargs)
+                response = _with_validators(response, request, current)
+                if _should_cache(request, response):
+                    page_timeout = timeout or settings.FEED_CACHE_TIMEOUT
+                    lifetime = page_timeout + settings.FEED_CACHE_STALE_TIMEOUT
+                    finished = time.time()
+                    pages.set(
+                        learn_cache_key(request, response, lifetime, prefix,
+                                        cache=pages),
+                        CachedPage(response, current,
+                                   finished + page_timeout,
+                                   finished - started),
+                        lifetime)
+            finally:
+                if page is not None:
+                    _release(key)
+            return response
+        return wrapper
+    return decorator
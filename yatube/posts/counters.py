@@ -0,0 +1,69 @@
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+
+def bump(model, pk, **deltas):
+    """Атомарно изменяет счётчики строки на заданные величины.
+
+    Уменьшение не опускает счётчик ниже нуля: после расхождения
+    отрицательное значение нарушило бы CHECK и сорвало удаление.
+    """
+    model.objects.filter(pk=pk).update(**{
+        field: F(field) + delta if delta >= 0
+        else Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()})
+
+
+def posts_count(user):
+    """Число постов пользователя; без строки `UserStats` — подсчётом."""
+    stats = getattr(user, 'stats', None)
+    if stats is None:
+        return user.posts.count()
+    return stats.posts_count
+
+
+def _count(queryset, field):
+    """Коррелированный подзапрос: число строк queryset для OuterRef('pk')."""
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by()
+        .values(field).annotate(total=Count('pk')).values('total')), 0)
+
+
+def _repair(queryset, **counters):
+    """Перезаписывает только разошедшиеся счётчики, возвращает их число."""
+    repaired = 0
+    for field, actual in counters.items():
+        repaired += queryset.exclude(**{field: actual}).update(
+            **{field: actual})
+    return repaired
+
+
+def reconcile(apps=global_apps):
+    """Пересчитывает все счётчики по исходным таблицам.
+
+    Принимает реестр приложений, чтобы работать и из миграций.
+    Возвращает число исправленных значений.
+    """
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Like = apps.get_model('posts', 'Like')
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+
+    UserStats.objects.bulk_create(
+        (UserStats(user_id=pk) for pk in User.objects.filter(
+            stats__isnull=True).values_list('pk', flat=True).iterator()),
+        batch_size=1000)
+    repaired = _repair(
+        Post.objects.all(),
+        comments_count=_count(Comment.objects.all(), 'post'),
+        likes_count=_count(Like.objects.all(), 'post'))
+    repaired += _repair(
+        UserStats.objects.all(),
+        posts_count=_count(Post.objects.all(), 'author'),
+        followers_count=_count(Follow.objects.all(), 'author'),
+        following_count=_count(Follow.objects.all(), 'user'))
+    return repaired
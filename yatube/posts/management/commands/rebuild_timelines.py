@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = 'Заново заполняет материализованные ленты подписок.'
+
+    def handle(self, *args, **options):
+        entries = timeline.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты пересобраны: {entries} записей.'))
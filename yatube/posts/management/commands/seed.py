@@ -0,0 +1,171 @@
+"""Синтетические данные в объёме боевой базы.
+
+Популярность авторов распределена по степенному закону: автор с рангом
+k (по id, начиная с первого созданного) получает подписки, посты и
+лайки с вероятностью примерно ~ 1/k, поэтому первые пользователи
+становятся знаменитостями. Объекты создаются генераторами и пишутся
+пачками по `--batch-size` в отдельных транзакциях, поэтому память не
+зависит от объёма. При одном и том же `--seed` данные одинаковы.
+"""
+import math
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from faker import Faker
+
+from posts.models import Comment, Follow, Group, Like, Post, User
+
+# Самое большое число подписок одного пользователя.
+MAX_FOLLOWING = 1000
+
+
+def power_law_index(rng, size):
+    """Индекс в [0, size) с вероятностью примерно ~ 1 / (индекс + 1)."""
+    return min(int(math.exp(rng.random() * math.log(size + 1))) - 1,
+               size - 1)
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Позволяет задать даты полям с auto_now_add при bulk_create."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, группами, '
+            'постами, комментариями, лайками и подписками.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--groups', type=int, default=500)
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--comments', type=int, default=2_000_000)
+        parser.add_argument('--likes', type=int, default=5_000_000)
+        parser.add_argument('--follows', type=int, default=None,
+                            help='По умолчанию 20 на пользователя.')
+        parser.add_argument('--days', type=int, default=730,
+                            help='За сколько дней распределить посты.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--password', default='password',
+                            help='Пароль всех созданных пользователей.')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.period = timedelta(days=options['days'])
+
+        users = self.insert(User, self.users(options['users'],
+                                             options['password']))
+        groups = self.insert(Group, self.groups(options['groups']))
+        with explicit_dates(Post._meta.get_field('pub_date'),
+                            Comment._meta.get_field('created')):
+            posts = self.insert(Post, self.posts(options['posts'], users,
+                                                 groups))
+            self.insert(Comment, self.comments(options['comments'], users,
+                                               posts))
+        self.insert(Like, self.likes(options['likes'], users, posts))
+        follows = options['follows']
+        if follows is None:
+            follows = 20 * options['users']
+        self.insert(Follow, self.follows(follows, users),
+                    ignore_conflicts=True)
+
+        call_command('reconcile_counters', stdout=self.stdout)
+        call_command('rebuild_timelines', stdout=self.stdout)
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS('Данные созданы.'))
+
+    def insert(self, model, objects, ignore_conflicts=False):
+        """Пишет объекты пачками; возвращает диапазон их id."""
+        before = model.objects.aggregate(last=Max('pk'))['last'] or 0
+        total = 0
+        while True:
+            batch = list(islice(objects, self.batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                model.objects.bulk_create(
+                    batch, ignore_conflicts=ignore_conflicts)
+            total += len(batch)
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: {total}', ending='\r')
+        self.stdout.write('')
+        ids = model.objects.filter(pk__gt=before).aggregate(
+            first=Min('pk'), last=Max('pk'))
+        if ids['first'] is None:
+            return range(0)
+        return range(ids['first'], ids['last'] + 1)
+
+    def pick(self, ids):
+        """Id с популярностью по степенному закону."""
+        return ids[power_law_index(self.rng, len(ids))]
+
+    def moment(self):
+        return self.now - self.period * self.rng.random()
+
+    def users(self, count, password):
+        password = make_password(password)
+        for i in range(count):
+            yield User(username=f'{self.fake.user_name()}{i}'[:150],
+                       first_name=self.fake.first_name(),
+                       last_name=self.fake.last_name(),
+                       email=self.fake.email(), password=password,
+                       date_joined=self.now - self.period)
+
+    def groups(self, count):
+        for i in range(count):
+            yield Group(title=f'{self.fake.catch_phrase()} {i}'[:200],
+                        slug=f'group-{i}',
+                        description=self.fake.paragraph())
+
+    def posts(self, count, users, groups):
+        for _ in range(count if users else 0):
+            group = None
+            if groups and self.rng.random() < 0.5:
+                group = self.pick(groups)
+            yield Post(author_id=self.pick(users), group_id=group,
+                       text=self.fake.text(self.rng.randint(50, 1000)),
+                       pub_date=self.moment())
+
+    def comments(self, count, users, posts):
+        for _ in range(count if posts else 0):
+            yield Comment(post_id=self.pick(posts),
+                          author_id=self.rng.choice(users),
+                          text=self.fake.sentence(),
+                          created=self.moment())
+
+    def likes(self, count, users, posts):
+        for _ in range(count if posts else 0):
+            yield Like(post_id=self.pick(posts),
+                       user_id=self.rng.choice(users))
+
+    def follows(self, count, users):
+        created = 0
+        while users and created < count:
+            user = self.rng.choice(users)
+            following = min(int(self.rng.paretovariate(1.2)), MAX_FOLLOWING,
+                            count - created)
+            for _ in range(following):
+                author = self.pick(users)
+                if author != user:
+                    yield Follow(user_id=user, author_id=author)
+            created += following
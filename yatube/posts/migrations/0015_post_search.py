@@ -0,0 +1,70 @@
+from django.db import migrations
+
+ROW = '''
+    SELECT p.id, p.text, COALESCE(g.title, ''),
+           u.username || ' ' || u.first_name || ' ' || u.last_name
+    FROM posts_post p
+    JOIN auth_user u ON u.id = p.author_id
+    LEFT JOIN posts_group g ON g.id = p.group_id
+'''
+
+INSERT = ('INSERT INTO posts_post_search (rowid, text, group_title, author)'
+          + ROW)
+
+CREATE = [
+    '''CREATE VIRTUAL TABLE posts_post_search USING fts5(
+        text, group_title, author,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )''',
+    f'''CREATE TRIGGER posts_post_search_insert AFTER INSERT ON posts_post
+    BEGIN
+        {INSERT} WHERE p.id = new.id;
+    END''',
+    f'''CREATE TRIGGER posts_post_search_update
+    AFTER UPDATE OF text, group_id, author_id ON posts_post
+    BEGIN
+        DELETE FROM posts_post_search WHERE rowid = old.id;
+        {INSERT} WHERE p.id = new.id;
+    END''',
+    '''CREATE TRIGGER posts_post_search_delete AFTER DELETE ON posts_post
+    BEGIN
+        DELETE FROM posts_post_search WHERE rowid = old.id;
+    END''',
+    '''CREATE TRIGGER posts_post_search_group
+    AFTER UPDATE OF title ON posts_group
+    BEGIN
+        UPDATE posts_post_search SET group_title = new.title WHERE rowid IN (
+            SELECT id FROM posts_post WHERE group_id = new.id);
+    END''',
+    '''CREATE TRIGGER posts_post_search_author
+    AFTER UPDATE OF username, first_name, last_name ON auth_user
+    BEGIN
+        UPDATE posts_post_search
+        SET author = new.username || ' ' || new.first_name || ' '
+                     || new.last_name
+        WHERE rowid IN (SELECT id FROM posts_post WHERE author_id = new.id);
+    END''',
+    INSERT,
+    "INSERT INTO posts_post_search (posts_post_search) VALUES ('optimize')",
+]
+
+DROP = [
+    'DROP TRIGGER IF EXISTS posts_post_search_author',
+    'DROP TRIGGER IF EXISTS posts_post_search_group',
+    'DROP TRIGGER IF EXISTS posts_post_search_delete',
+    'DROP TRIGGER IF EXISTS posts_post_search_update',
+    'DROP TRIGGER IF EXISTS posts_post_search_insert',
+    'DROP TABLE IF EXISTS posts_post_search',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0014_engagement_counters'),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=CREATE, reverse_sql=DROP),
+    ]
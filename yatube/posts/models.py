@@ -15,6 +15,28 @@ class Group(models.Model):
         return self.title
 
 
+# Поля поста, которые меняются только атомарными UPDATE.
+COUNTERS = ('comments_count', 'likes_count')
+
+
+class PostQuerySet(models.QuerySet):
+    def for_feed(self, user):
+        """Посты для ленты: автор и группа в том же запросе,
+        а флаг `is_liked` показывает, лайкнул ли пост пользователь.
+        Число лайков и комментариев хранится в самом посте."""
+        posts = self.select_related('author', 'group')
+        if not user.is_authenticated:
+            return posts.annotate(
+                is_liked=models.Value(False, models.BooleanField()))
+        return posts.annotate(is_liked=models.Exists(
+            Like.objects.filter(user=user, post=models.OuterRef('pk'))))
+
+    def for_detail(self, user):
+        """Пост для отдельной страницы: всё из `for_feed` плюс счётчики
+        автора. Комментарии выбираются постранично отдельно."""
+        return self.for_feed(user).select_related('author__stats')
+
+
 class Post(models.Model):
     text = models.TextField(verbose_name='Текст',
                             help_text='Введите текст поста')
@@ -34,15 +56,40 @@ class Post(models.Model):
                               upload_to='posts/',
                               blank=True,
                               null=True,)
+    comments_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Комментариев')
+    likes_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Лайков')
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_pub_date_id_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date_idx'),
+        )
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
     def __str__(self):
         return self.text[:15]
 
+    def save(self, force_insert=False, force_update=False, using=None,
+             update_fields=None):
+        """Счётчики меняет только `counters.bump`, поэтому сохранение
+        загруженного поста не перезаписывает их устаревшими значениями."""
+        if (update_fields is None and not force_insert
+                and not self._state.adding):
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in COUNTERS]
+        super().save(force_insert, force_update, using, update_fields)
+
 
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE,
@@ -57,6 +104,10 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ('-created',)
+        indexes = (
+            models.Index(fields=['post', '-created', '-id'],
+                         name='comment_post_created_idx'),
+        )
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
@@ -75,6 +126,10 @@ class Follow(models.Model):
             models.UniqueConstraint(fields=['user', 'author'],
                                     name='unique_follow'),
         )
+        indexes = (
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx'),
+        )
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
 
@@ -84,3 +139,45 @@ class Like(models.Model):
                              related_name='liker')
     post = models.ForeignKey(Post, on_delete=models.CASCADE,
                              related_name='liked_post')
+
+    class Meta:
+        indexes = (
+            models.Index(fields=['user', 'post'], name='like_user_post_idx'),
+        )
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, которые иначе пришлось бы агрегировать."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE,
+                                primary_key=True, related_name='stats')
+    posts_count = models.PositiveIntegerField(default=0,
+                                              verbose_name='Постов')
+    followers_count = models.PositiveIntegerField(
+        default=0, verbose_name='Подписчиков')
+    following_count = models.PositiveIntegerField(default=0,
+                                                  verbose_name='Подписок')
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписок пользователя."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='timeline')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='timeline_entries')
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_timeline_entry'),
+        )
+        indexes = (
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_pub_date_idx'),
+        )
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
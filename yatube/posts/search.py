@@ -0,0 +1,132 @@
+"""Полнотекстовый поиск по постам на SQLite FTS5.
+
+Индекс `posts_post_search` хранит текст поста, название группы и имя
+автора; rowid строки совпадает с id поста. Таблицу и поддерживающие её
+триггеры создаёт миграция `0015_post_search`, поэтому индекс не
+расходится с таблицами даже при массовых `update()` и правках в обход
+ORM. `INSERT` здесь повторяет заполнение из миграции для `rebuild()`.
+"""
+import re
+
+from django.db import connection, models
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+from .utils import NEXT, CursorPaginator
+
+TABLE = 'posts_post_search'
+
+# Веса столбцов для bm25: текст, группа, автор.
+WEIGHTS = (1.0, 0.5, 0.5)
+SNIPPET_TOKENS = 16
+MAX_TERMS = 10
+
+_ROW = '''
+    SELECT p.id, p.text, COALESCE(g.title, ''),
+           u.username || ' ' || u.first_name || ' ' || u.last_name
+    FROM posts_post p
+    JOIN auth_user u ON u.id = p.author_id
+    LEFT JOIN posts_group g ON g.id = p.group_id
+'''
+
+INSERT = f'INSERT INTO {TABLE} (rowid, text, group_title, author) {_ROW}'
+
+REBUILD = (
+    f'DELETE FROM {TABLE}',
+    INSERT,
+    f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')",
+)
+
+# Границы совпадений в сниппете: управляющие символы не встречаются в
+# тексте постов и не экранируются, поэтому их можно заменить на теги
+# уже после экранирования.
+_MARK_START, _MARK_END = '\x02', '\x03'
+
+
+def rebuild():
+    """Заново заполняет индекс из таблиц постов, групп и авторов."""
+    with connection.cursor() as cursor:
+        for statement in REBUILD:
+            cursor.execute(statement)
+        cursor.execute(f'SELECT COUNT(*) FROM {TABLE}')
+        return cursor.fetchone()[0]
+
+
+def match_query(query):
+    """Запрос FTS5 из пользовательской строки или None, если искать нечего.
+
+    Слова ищутся по префиксу и все сразу; синтаксис FTS5 во вводе
+    пользователя не интерпретируется.
+    """
+    terms = re.findall(r'\w+', query)[:MAX_TERMS]
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def matching_ids(match):
+    """Подзапрос id постов, подходящих под запрос FTS5."""
+    return models.expressions.RawSQL(
+        f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s', (match,))
+
+
+def highlight(snippet):
+    """Экранирует сниппет и выделяет совпадения тегом <mark>."""
+    return mark_safe(escape(snippet).replace(_MARK_START, '<mark>')
+                     .replace(_MARK_END, '</mark>'))
+
+
+class SearchPaginator(CursorPaginator):
+    """Результаты поиска по убыванию релевантности, страницы по ключу.
+
+    Ключ страницы — пара `(score, pk)`, где score — bm25 с обратным
+    знаком. Посты выбираются по найденным id через `for_feed`, у каждого
+    заполнены `score` и `snippet`. Релевантность зависит от статистики
+    всего индекса, поэтому после добавления постов соседние страницы
+    могут слегка сдвинуться.
+    """
+
+    def __init__(self, query, user, per_page):
+        super().__init__(Post.objects.for_feed(user), per_page,
+                         keys=('score', 'pk'))
+        self.query = query
+        self.match = match_query(query)
+
+    def _field(self, name):
+        if name == 'score':
+            field = models.FloatField()
+            field.set_attributes_from_name(name)
+            return field
+        return super()._field(name)
+
+    def _fetch(self, direction, values):
+        if self.match is None:
+            return []
+        order, compare = ('DESC', '<') if direction == NEXT else ('ASC', '>')
+        weights = ', '.join(map(str, WEIGHTS))
+        condition, params = '', [self.match]
+        if values:
+            score, pk = values
+            condition = (f'AND (score {compare} %s '
+                         f'OR (score = %s AND rowid {compare} %s))')
+            params += [score, score, pk]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'''SELECT rowid, -bm25({TABLE}, {weights}) AS score,
+                           snippet({TABLE}, -1, %s, %s, '…', %s)
+                    FROM {TABLE}
+                    WHERE {TABLE} MATCH %s {condition}
+                    ORDER BY score {order}, rowid {order}
+                    LIMIT %s''',
+                [_MARK_START, _MARK_END, SNIPPET_TOKENS, *params,
+                 self.per_page + 1])
+            rows = cursor.fetchall()
+        posts = self.object_list.in_bulk([row[0] for row in rows])
+        found = []
+        for pk, score, snippet in rows:
+            post = posts.get(pk)
+            if post is not None:
+                post.score, post.snippet = score, highlight(snippet)
+                found.append(post)
+        return found
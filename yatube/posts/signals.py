@@ -0,0 +1,180 @@
+import threading
+
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from core import metrics
+
+from . import timeline
+from .caching import (author_scope, bump_on_commit, group_scope,
+                      index_scope, post_scope, post_scopes)
+from .counters import bump
+from .models import Comment, Follow, Group, Like, Post, User, UserStats
+
+
+# Поля пользователя, которые показываются в лентах и комментариях.
+NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=User)
+def user_changing(sender, instance, update_fields=None, **kwargs):
+    instance._saved_names = None
+    if instance.pk is not None and (
+            update_fields is None or set(update_fields) & set(NAME_FIELDS)):
+        instance._saved_names = User.objects.filter(
+            pk=instance.pk).values_list(*NAME_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.create(user=instance)
+        return
+    saved = getattr(instance, '_saved_names', None)
+    if saved is None or saved == tuple(
+            getattr(instance, field) for field in NAME_FIELDS):
+        return
+    scopes = {index_scope(), author_scope(saved[0]),
+              author_scope(instance.username)}
+    scopes.update(map(group_scope, Group.objects.filter(
+        posts__author=instance).values_list('slug', flat=True).distinct()))
+    scopes.update(map(post_scope, Comment.objects.filter(
+        author=instance).values_list('post_id', flat=True).distinct()))
+    bump_on_commit(scopes)
+
+
+@receiver(pre_save, sender=Post)
+def post_changing(sender, instance, **kwargs):
+    instance._saved_group_slug = None
+    if instance.pk is not None:
+        instance._saved_group_slug = Post.objects.filter(
+            pk=instance.pk).values_list('group__slug', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        metrics.objects_created.inc(model=sender._meta.model_name)
+        bump(UserStats, instance.author_id, posts_count=1)
+        timeline.fan_out(instance)
+    bump_on_commit(post_scopes(instance, instance._saved_group_slug))
+
+
+class DeletingPosts:
+    """Посты, которые удаляются вместе с комментариями и лайками.
+
+    Для них счётчики и ленты не трогаются на каждой дочерней строке.
+    Отметка стоит в очереди on_commit транзакции, поэтому откат удаления
+    снимает её вместе с очередью, а фиксация — выполнив её.
+    """
+
+    local = threading.local()
+
+    def __init__(self, connection):
+        self.ids = set()
+        self.sids = list(connection.savepoint_ids)
+        self.index = len(connection.run_on_commit)
+
+    def __call__(self):
+        self.ids.clear()
+
+    def pending(self, connection):
+        queue = connection.run_on_commit
+        return (self.sids == connection.savepoint_ids
+                and self.index < len(queue) and queue[self.index][1] is self)
+
+    @classmethod
+    def current(cls, using, create=False):
+        """Отметка текущей транзакции или точки сохранения."""
+        connection = transaction.get_connection(using)
+        marks = cls.local.__dict__.setdefault('marks', {})
+        mark = marks.get(using)
+        if mark is not None and mark.pending(connection):
+            return mark.ids
+        if not (create and connection.in_atomic_block):
+            return set()
+        marks[using] = mark = cls(connection)
+        transaction.on_commit(mark, using)
+        return mark.ids
+
+
+def scopes_of(post_id):
+    """Как `post_scopes`, но по id поста: автор и группа одним запросом."""
+    scopes = {index_scope(), post_scope(post_id)}
+    row = Post.objects.filter(pk=post_id).values_list(
+        'author__username', 'group__slug').first()
+    if row is not None:
+        username, slug = row
+        scopes.add(author_scope(username))
+        if slug:
+            scopes.add(group_scope(slug))
+    return scopes
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, using, **kwargs):
+    DeletingPosts.current(using, create=True).add(instance.pk)
+    bump_on_commit(post_scopes(instance))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, using, **kwargs):
+    DeletingPosts.current(using).discard(instance.pk)
+    bump(UserStats, instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        metrics.objects_created.inc(model=sender._meta.model_name)
+        bump(Post, instance.post_id, comments_count=1)
+        bump_on_commit(scopes_of(instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, using, **kwargs):
+    if instance.post_id in DeletingPosts.current(using):
+        return
+    bump(Post, instance.post_id, comments_count=-1)
+    bump_on_commit(scopes_of(instance.post_id))
+
+
+@receiver(post_save, sender=Like)
+def like_created(sender, instance, created, **kwargs):
+    if created:
+        metrics.objects_created.inc(model=sender._meta.model_name)
+        bump(Post, instance.post_id, likes_count=1)
+        bump_on_commit(scopes_of(instance.post_id))
+
+
+@receiver(post_delete, sender=Like)
+def like_deleted(sender, instance, using, **kwargs):
+    if instance.post_id in DeletingPosts.current(using):
+        return
+    bump(Post, instance.post_id, likes_count=-1)
+    bump_on_commit(scopes_of(instance.post_id))
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        metrics.objects_created.inc(model=sender._meta.model_name)
+        bump(UserStats, instance.author_id, followers_count=1)
+        bump(UserStats, instance.user_id, following_count=1)
+        timeline.backfill(instance.user_id, instance.author_id)
+        bump_on_commit([author_scope(instance.author.username)])
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    bump(UserStats, instance.author_id, followers_count=-1)
+    bump(UserStats, instance.user_id, following_count=-1)
+    timeline.unfollow(instance.user_id, instance.author_id)
+    bump_on_commit([author_scope(instance.author.username)])
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, **kwargs):
+    bump_on_commit([group_scope(instance.slug)])
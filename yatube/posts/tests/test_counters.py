@@ -0,0 +1,143 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.db.models.sql import DeleteQuery
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Like, Post, UserStats
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        cls.author = User.objects.create_user(username='author')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_counters_follow_create_and_delete(self):
+        """Счётчики меняются при создании и удалении объектов."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        comment = Comment.objects.create(post=post, author=self.user,
+                                         text='Коммент')
+        like = Like.objects.create(post=post, user=self.user)
+        follow = Follow.objects.create(user=self.user, author=self.author)
+
+        post.refresh_from_db()
+        self.assertEqual((post.comments_count, post.likes_count), (1, 1))
+        self.assertEqual(UserStats.objects.get(user=self.author).posts_count,
+                         1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).following_count, 1)
+
+        comment.delete()
+        like.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual((post.comments_count, post.likes_count), (0, 0))
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 0)
+
+        post.delete()
+        self.assertEqual(UserStats.objects.get(user=self.author).posts_count,
+                         0)
+
+    def test_edit_keeps_counters(self):
+        """Правка загруженного раньше поста не сбрасывает счётчики."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Like.objects.create(post=post, user=self.user)
+        Comment.objects.create(post=post, author=self.user, text='Коммент')
+
+        post.text = 'Исправленный пост'
+        post.save()
+
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Исправленный пост')
+        self.assertEqual((post.comments_count, post.likes_count), (1, 1))
+
+    def delete_queries(self, children):
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.user, text='Коммент')
+            for _ in range(children))
+        Like.objects.bulk_create(
+            Like(post=post, user=self.user) for _ in range(children))
+        with CaptureQueriesContext(connection) as queries:
+            post.delete()
+        return len(queries)
+
+    def test_post_delete_cost_independent_of_children(self):
+        """Удаление поста не делает запросов на каждый комментарий и лайк."""
+        self.assertEqual(self.delete_queries(30), self.delete_queries(3))
+        self.assertEqual(UserStats.objects.get(user=self.author).posts_count,
+                         0)
+
+    def test_failed_post_delete_leaves_no_mark(self):
+        """Сорвавшееся удаление поста не отключает счётчики его детей."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        comment = Comment.objects.create(post=post, author=self.user,
+                                         text='Коммент')
+        with mock.patch.object(DeleteQuery, 'delete_batch',
+                               side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError), transaction.atomic():
+                post.delete()
+
+        comment.delete()
+
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_pages_without_stats_row(self):
+        """Без строки UserStats страницы автора считают посты сами."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        UserStats.objects.filter(user=self.author).delete()
+
+        for url in (reverse('posts:profile',
+                            kwargs={'username': self.author.username}),
+                    reverse('posts:post_detail',
+                            kwargs={'post_id': post.pk})):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.context['author_posts_count'], 1)
+
+    def test_decrement_clamped_at_zero(self):
+        """После расхождения уменьшение не уводит счётчик ниже нуля."""
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        UserStats.objects.filter(user=self.author).update(followers_count=0)
+
+        follow.delete()
+
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 0)
+
+    def test_reconcile_counters_repairs_drift(self):
+        """Команда reconcile_counters исправляет разошедшиеся счётчики."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Like.objects.create(post=post, user=self.user)
+        Follow.objects.create(user=self.user, author=self.author)
+        Post.objects.filter(pk=post.pk).update(likes_count=7)
+        UserStats.objects.filter(user=self.author).update(posts_count=0)
+        UserStats.objects.filter(user=self.user).delete()
+        out = StringIO()
+
+        call_command('reconcile_counters', stdout=out)
+
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, 1)
+        self.assertEqual(UserStats.objects.get(user=self.author).posts_count,
+                         1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).following_count, 1)
+        self.assertIn('3', out.getvalue())
@@ -0,0 +1,105 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.test import TestCase
+
+from ..models import Comment, Follow, Group, Post, TimelineEntry
+from ..utils import NEXT, CursorPaginator
+
+User = get_user_model()
+
+
+class QueryPlanTests(TestCase):
+    """Горячие запросы идут по составным индексам.
+
+    Для каждого запроса проверяется EXPLAIN QUERY PLAN: нужный индекс
+    используется, а сортировки во временном B-дереве нет.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        cls.post = Post.objects.create(author=cls.author, group=cls.group,
+                                       text='Пост')
+        Comment.objects.create(post=cls.post, author=cls.user, text='Да')
+
+    def window(self, queryset, keys=('pub_date', 'pk'), after=None):
+        """Запрос страницы так, как его строит CursorPaginator."""
+        paginator = CursorPaginator(queryset, 10, keys=keys)
+        values = [paginator._field(name).value_from_object(after)
+                  for name in keys] if after else []
+        return paginator._window(queryset, keys, NEXT, values)
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(f'INDEX {index}', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_index_feed(self):
+        """Главная лента идёт по индексу даты."""
+        for after in (None, self.post):
+            with self.subTest(after=after):
+                self.assertUsesIndex(
+                    self.window(Post.objects.for_feed(AnonymousUser()),
+                                after=after),
+                    'post_pub_date_id_idx')
+
+    def test_group_feed(self):
+        """Лента группы идёт по индексу группы и даты."""
+        for after in (None, self.post):
+            with self.subTest(after=after):
+                self.assertUsesIndex(
+                    self.window(self.group.posts.for_feed(self.user),
+                                after=after),
+                    'post_group_pub_date_idx')
+
+    def test_profile_feed(self):
+        """Посты автора идут по индексу автора и даты."""
+        for after in (None, self.post):
+            with self.subTest(after=after):
+                self.assertUsesIndex(
+                    self.window(self.author.posts.for_feed(self.user),
+                                after=after),
+                    'post_author_pub_date_idx')
+
+    def test_celebrity_posts_in_timeline(self):
+        """Посты знаменитостей в ленте подписок — по индексу автора."""
+        self.assertUsesIndex(
+            self.window(Post.objects.filter(
+                author__following__user=self.user,
+                author_id__in=[self.author.pk])),
+            'post_author_pub_date_idx')
+
+    def test_timeline_entries(self):
+        """Записи ленты подписок читаются диапазоном индекса."""
+        self.assertUsesIndex(
+            self.window(TimelineEntry.objects.filter(
+                user=self.user).order_by('-pub_date'),
+                keys=('pub_date', 'post_id')),
+            'timeline_user_pub_date_idx')
+
+    def test_comments(self):
+        """Комментарии поста идут по индексу поста и даты."""
+        comment = self.post.comments.get()
+        for after in (None, comment):
+            with self.subTest(after=after):
+                self.assertUsesIndex(
+                    self.window(Comment.objects.filter(
+                        post=self.post).select_related('author'),
+                        keys=('created', 'pk'), after=after),
+                    'comment_post_created_idx')
+
+    def test_is_liked_flag(self):
+        """Флаг is_liked проверяется по индексу (user, post)."""
+        self.assertUsesIndex(Post.objects.for_feed(self.user),
+                             'like_user_post_idx')
+
+    def test_followers_of_author(self):
+        """Подписчики автора читаются из покрывающего индекса."""
+        self.assertUsesIndex(
+            Follow.objects.filter(author=self.author).values_list(
+                'user_id', flat=True),
+            'follow_author_user_idx')
@@ -0,0 +1,172 @@
+import time
+from contextlib import ExitStack
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import Count
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.instrumentation import databases
+
+from ..models import Comment, Follow, Group, Like, Post, User
+
+SIZES = {'users': 40, 'groups': 3, 'posts': 300, 'comments': 600,
+         'likes': 600, 'follows': 300, 'batch_size': 100}
+
+# Предел времени одного запроса: ловит порядковые регрессии, а не шум.
+WALL_TIME = 1.0
+
+# Наибольшее число запросов к базе при холодном кэше страниц и десяти
+# постах и комментариях на странице.
+# Ключ — (маршрут, вошёл ли пользователь).
+BUDGETS = {
+    ('index', False): 1,
+    ('index', True): 3,
+    ('group_list', False): 2,
+    ('group_list', True): 4,
+    ('profile', False): 2,
+    ('profile', True): 5,
+    ('post_detail', False): 3,
+    ('post_detail', True): 5,
+    ('follow_index', False): 0,
+    ('follow_index', True): 5,
+    ('post_create', False): 0,
+    ('post_create', True): 3,
+    ('post_create_submit', True): 11,
+    ('post_edit', False): 0,
+    ('post_edit', True): 5,
+    ('post_edit_submit', True): 8,
+    ('post_like', False): 0,
+    ('post_like', True): 9,
+    ('post_unlike', True): 12,
+    ('profile_follow', False): 0,
+    ('profile_follow', True): 12,
+    ('profile_unfollow', True): 13,
+}
+
+
+@override_settings(POSTS_PER_PAGE=10, COMMENTS_PER_PAGE=10)
+class QueryBudgetTests(TestCase):
+    """Число запросов и время каждого представления на засеянной базе."""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed', stdout=StringIO(), **SIZES)
+        cls.reader = User.objects.annotate(
+            n=Count('follower')).order_by('-n', 'pk').first()
+        cls.author = User.objects.annotate(
+            n=Count('posts')).order_by('-n', 'pk').first()
+        cls.group = Group.objects.annotate(
+            n=Count('posts')).order_by('-n', 'pk').first()
+        cls.post = Post.objects.annotate(
+            n=Count('comments')).order_by('-n', 'pk').first()
+        cls.own_post = Post.objects.filter(author=cls.reader).first() or (
+            Post.objects.create(author=cls.reader, text='Свой пост'))
+        cls.unliked, cls.liked = Post.objects.exclude(
+            liked_post__user=cls.reader)[:2]
+        Like.objects.create(user=cls.reader, post=cls.liked)
+        cls.stranger = User.objects.exclude(
+            following__user=cls.reader).exclude(pk=cls.reader.pk).first()
+        cls.followed = Follow.objects.filter(
+            user=cls.reader).exclude(author=cls.reader).first().author
+
+    def setUp(self):
+        self.guest = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def routes(self):
+        """(имя, метод, адрес, данные) для каждого проверяемого маршрута."""
+        post = {'post_id': self.post.pk}
+        return [
+            ('index', 'get', reverse('posts:index'), None),
+            ('group_list', 'get', reverse(
+                'posts:group_list', kwargs={'slug': self.group.slug}), None),
+            ('profile', 'get', reverse(
+                'posts:profile',
+                kwargs={'username': self.author.username}), None),
+            ('post_detail', 'get', reverse('posts:post_detail', kwargs=post),
+             None),
+            ('follow_index', 'get', reverse('posts:follow_index'), None),
+            ('post_create', 'get', reverse('posts:post_create'), None),
+            ('post_create_submit', 'post', reverse('posts:post_create'),
+             {'text': 'Новый пост', 'group': self.group.pk}),
+            ('post_edit', 'get', reverse(
+                'posts:post_edit', kwargs={'post_id': self.own_post.pk}),
+             None),
+            ('post_edit_submit', 'post', reverse(
+                'posts:post_edit', kwargs={'post_id': self.own_post.pk}),
+             {'text': 'Исправленный пост'}),
+            ('post_like', 'get', reverse(
+                'posts:post_like', kwargs={'post_id': self.unliked.pk}),
+             None),
+            ('post_unlike', 'get', reverse(
+                'posts:post_unlike', kwargs={'post_id': self.liked.pk}),
+             None),
+            ('profile_follow', 'get', reverse(
+                'posts:profile_follow',
+                kwargs={'username': self.stranger.username}), None),
+            ('profile_unfollow', 'get', reverse(
+                'posts:profile_unfollow',
+                kwargs={'username': self.followed.username}), None),
+        ]
+
+    def measure(self, client, method, url, data):
+        """Число запросов ко всем базам и время одного запроса."""
+        cache.clear()
+        with ExitStack() as stack:
+            captured = [stack.enter_context(CaptureQueriesContext(db))
+                        for db in databases()]
+            started = time.perf_counter()
+            response = getattr(client, method)(url, data)
+            elapsed = time.perf_counter() - started
+        self.assertLess(response.status_code, 400, url)
+        return sum(len(queries) for queries in captured), elapsed
+
+    def test_budgets(self):
+        """Каждое представление укладывается в бюджет запросов и времени."""
+        for name, method, url, data in self.routes():
+            for authenticated, client in ((False, self.guest),
+                                          (True, self.reader_client)):
+                budget = BUDGETS.get((name, authenticated))
+                if budget is None:
+                    continue
+                with self.subTest(route=name, authenticated=authenticated):
+                    queries, elapsed = self.measure(client, method, url,
+                                                    data)
+                    self.assertLessEqual(queries, budget)
+                    self.assertLess(elapsed, WALL_TIME)
+
+    def counts(self):
+        """Число запросов читающих страниц вошедшего пользователя."""
+        toggles = ('post_like', 'post_unlike', 'profile_')
+        return {
+            name: self.measure(self.reader_client, method, url, data)[0]
+            for name, method, url, data in self.routes()
+            if method == 'get' and not name.startswith(toggles)
+        }
+
+    def test_independent_of_page_size(self):
+        """Число запросов не зависит от размера страницы."""
+        with override_settings(POSTS_PER_PAGE=2, COMMENTS_PER_PAGE=2):
+            small = self.counts()
+        with override_settings(POSTS_PER_PAGE=50, COMMENTS_PER_PAGE=50):
+            large = self.counts()
+
+        self.assertEqual(small, large)
+
+    def test_independent_of_activity(self):
+        """Число запросов не растёт с комментариями, лайками и подписками."""
+        before = self.counts()
+        users = list(User.objects.exclude(pk=self.reader.pk)[:20])
+        for user in users:
+            Comment.objects.create(post=self.post, author=user, text='Ещё')
+            Like.objects.create(post=self.post, user=user)
+            Follow.objects.get_or_create(user=user, author=self.author)
+            Follow.objects.get_or_create(user=self.reader, author=user)
+            Post.objects.create(author=user, text='Пост', group=self.group)
+
+        self.assertEqual(self.counts(), before)
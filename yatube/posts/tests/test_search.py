@@ -0,0 +1,124 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import search
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='tolstoy',
+                                              first_name='Лев')
+        cls.group = Group.objects.create(title='Дневники', slug='diaries',
+                                         description='Записи')
+        cls.moscow = Post.objects.create(
+            author=cls.author, text='Уехал из Москвы в Тулу. Москва шумит.')
+        cls.tula = Post.objects.create(
+            author=cls.author, group=cls.group,
+            text='В Туле видел тёток, а о Москве и не думал.')
+        cls.other = Post.objects.create(
+            author=User.objects.create_user(username='other'),
+            text='<b>Кавказ</b> и горы')
+        cls.url = reverse('posts:search')
+
+    def setUp(self):
+        self.client = Client()
+
+    def search(self, query, **params):
+        response = self.client.get(self.url, {'q': query, **params})
+        return response, response.context['page_obj']
+
+    def test_ranked_results_with_snippets(self):
+        """Результаты по релевантности, совпадения выделены."""
+        response, page_obj = self.search('москв')
+
+        self.assertEqual(list(page_obj), [self.moscow, self.tula])
+        self.assertGreater(page_obj[0].score, page_obj[1].score)
+        self.assertIn('<mark>Москвы</mark>', page_obj[0].snippet)
+        self.assertContains(response, '<mark>Москва</mark>')
+
+    def test_snippet_escaped(self):
+        """HTML из текста поста в сниппете экранируется."""
+        response, page_obj = self.search('кавказ')
+
+        self.assertEqual(page_obj[0].snippet,
+                         '&lt;b&gt;<mark>Кавказ</mark>&lt;/b&gt; и горы')
+        self.assertNotContains(response, '<b>Кавказ')
+
+    def test_search_by_group_and_author(self):
+        """Ищется по названию группы и имени автора."""
+        self.assertEqual(list(self.search('дневники')[1]), [self.tula])
+        self.assertEqual(set(self.search('лев')[1]), {self.moscow, self.tula})
+
+    def test_fts_syntax_in_query_is_ignored(self):
+        """Операторы FTS5 во вводе не ломают запрос."""
+        response, page_obj = self.search('москв"*) -(')
+        self.assertEqual(len(page_obj), 2)
+
+        response = self.client.get(self.url, {'q': '"*'})
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_no_query(self):
+        """Без запроса показывается только форма."""
+        response = self.client.get(self.url)
+        self.assertIsNone(response.context['page_obj'])
+
+    @override_settings(POSTS_PER_PAGE=1)
+    def test_keyset_pagination(self):
+        """Курсор ведёт на следующую страницу и сохраняет запрос."""
+        response, first = self.search('москв')
+        cursor = first.paginator.next_cursor
+        self.assertContains(response, f'?q=%D0%BC%D0%BE%D1%81%D0%BA%D0%B2'
+                                      f'&amp;cursor={cursor}')
+
+        _, second = self.search('москв', cursor=cursor)
+        self.assertEqual(list(first) + list(second),
+                         [self.moscow, self.tula])
+        self.assertFalse(second.has_next())
+        self.assertTrue(second.has_previous())
+
+    def test_index_follows_changes(self):
+        """Триггеры обновляют индекс при правке постов, групп и авторов."""
+        self.moscow.text = 'Приехал в Бухарест'
+        self.moscow.save()
+        Group.objects.filter(pk=self.group.pk).update(title='Письма')
+        User.objects.filter(pk=self.author.pk).update(username='leo')
+        self.other.delete()
+
+        self.assertEqual(list(self.search('бухарест')[1]), [self.moscow])
+        self.assertEqual(list(self.search('москв')[1]), [self.tula])
+        self.assertEqual(list(self.search('письма')[1]), [self.tula])
+        self.assertEqual(len(self.search('дневники')[1]), 0)
+        self.assertEqual(len(self.search('leo')[1]), 2)
+        self.assertEqual(len(self.search('кавказ')[1]), 0)
+
+    def test_rebuild_command(self):
+        """Команда rebuild_search_index восстанавливает индекс."""
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.TABLE}')
+        out = StringIO()
+
+        call_command('rebuild_search_index', stdout=out)
+
+        self.assertIn('3', out.getvalue())
+        self.assertEqual(len(self.search('москв')[1]), 2)
+
+    def test_admin_uses_index(self):
+        """Поиск в админке идёт по тому же индексу."""
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        self.client.force_login(admin)
+
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'дневники'})
+
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.tula])
@@ -0,0 +1,56 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db.models import Count, F, Sum
+from django.test import TestCase
+
+from ..models import Comment, Follow, Group, Like, Post, User, UserStats
+
+SIZES = {'users': 60, 'groups': 3, 'posts': 200, 'comments': 100,
+         'likes': 150, 'follows': 600, 'batch_size': 50}
+
+
+class SeedTests(TestCase):
+    def seed(self, **options):
+        call_command('seed', stdout=StringIO(), **{**SIZES, **options})
+
+    def test_creates_requested_volume(self):
+        """Создаётся заданное число объектов, счётчики сходятся."""
+        self.seed()
+
+        self.assertEqual(User.objects.count(), 60)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 100)
+        self.assertEqual(Like.objects.count(), 150)
+        self.assertEqual(UserStats.objects.count(), 60)
+        self.assertEqual(
+            Post.objects.aggregate(total=Sum('comments_count'))['total'],
+            100)
+        self.assertTrue(self.client.login(
+            username=User.objects.first().username, password='password'))
+
+    def test_follow_graph_has_celebrities(self):
+        """Подписки распределены неравномерно: есть знаменитости."""
+        self.seed(users=200, follows=1000, posts=0)
+
+        followers = sorted(
+            Follow.objects.values('author').annotate(n=Count('id'))
+            .values_list('n', flat=True), reverse=True)
+        self.assertGreater(followers[0], 10 * followers[len(followers) // 2])
+        self.assertFalse(Follow.objects.filter(
+            user=F('author')).exists())
+
+    def test_deterministic(self):
+        """Одинаковый seed даёт одинаковые данные."""
+        self.seed(seed=7)
+        first = list(Post.objects.order_by('pk').values_list(
+            'text', 'author__username', 'pub_date__date'))
+        for model in (Follow, Like, Comment, Post, Group, User):
+            model.objects.all().delete()
+
+        self.seed(seed=7)
+        second = list(Post.objects.order_by('pk').values_list(
+            'text', 'author__username', 'pub_date__date'))
+
+        self.assertEqual(first, second)
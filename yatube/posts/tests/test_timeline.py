@@ -0,0 +1,114 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.celebrity = User.objects.create_user(username='celebrity')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def feed(self, **params):
+        return self.client.get(reverse('posts:follow_index'),
+                               params).context['page_obj']
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        """Новый пост попадает в материализованную ленту подписчика."""
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(author=self.author, text='Пост')
+
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=post, pub_date=post.pub_date).exists())
+
+    def test_follow_backfills_and_unfollow_trims(self):
+        """Подписка заполняет ленту прошлыми постами, отписка чистит её."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        self.client.get(reverse('posts:profile_follow',
+                                kwargs={'username': self.author.username}))
+
+        self.assertEqual(list(self.feed()), [post])
+
+        self.client.get(reverse('posts:profile_unfollow',
+                                kwargs={'username': self.author.username}))
+
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user).exists())
+        self.assertEqual(list(self.feed()), [])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1, POSTS_PER_PAGE=3)
+    def test_celebrity_posts_are_merged_on_read(self):
+        """Посты знаменитостей не раскладываются, а сливаются при чтении."""
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=self.user, author=self.celebrity)
+        Follow.objects.create(user=self.author, author=self.celebrity)
+        cache.clear()
+        posts = [Post.objects.create(author=author, text=f'Пост {i}')
+                 for i, author in enumerate(
+                     (self.author, self.celebrity) * 3)]
+        expected = sorted(posts, key=lambda post: (post.pub_date, post.pk),
+                          reverse=True)
+
+        self.assertFalse(TimelineEntry.objects.filter(
+            post__author=self.celebrity).exists())
+        first_page = self.feed()
+        second_page = self.feed(cursor=first_page.paginator.next_cursor)
+        self.assertEqual(list(first_page) + list(second_page), expected)
+        self.assertFalse(second_page.has_next())
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_demoted_celebrity_posts_are_fanned_out(self):
+        """Посты автора, опустившегося ниже порога, не пропадают из ленты."""
+        Follow.objects.create(user=self.author, author=self.celebrity)
+        Follow.objects.create(user=self.user, author=self.celebrity)
+        cache.clear()
+        old = Post.objects.create(author=self.celebrity, text='Старый пост')
+        self.assertFalse(TimelineEntry.objects.exists())
+
+        Follow.objects.filter(user=self.author).delete()
+        cache.clear()
+        new = Post.objects.create(author=self.celebrity, text='Новый пост')
+
+        self.assertEqual(list(self.feed()), [new, old])
+
+    def test_rebuild_timelines_command(self):
+        """Команда rebuild_timelines восстанавливает ленты."""
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(author=self.author, text='Пост')
+        TimelineEntry.objects.all().delete()
+
+        call_command('rebuild_timelines', stdout=StringIO())
+
+        self.assertEqual(list(self.feed()), [post])
+
+    @override_settings(TIMELINE_BACKFILL=2, TIMELINE_BATCH_SIZE=1,
+                       TIMELINE_FANOUT_LIMIT=2)
+    def test_rebuild_keeps_window_and_skips_celebrities(self):
+        """Пересборка берёт последние посты авторов, кроме знаменитостей."""
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=self.user, author=self.celebrity)
+        Follow.objects.create(user=self.author, author=self.celebrity)
+        posts = [Post.objects.create(author=self.author, text=f'Пост {i}')
+                 for i in range(3)]
+        Post.objects.create(author=self.celebrity, text='Пост знаменитости')
+        TimelineEntry.objects.all().delete()
+
+        call_command('rebuild_timelines', stdout=StringIO())
+
+        self.assertEqual(
+            set(TimelineEntry.objects.values_list('user', 'post')),
+            {(self.user.pk, post.pk) for post in posts[1:]})
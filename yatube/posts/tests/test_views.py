@@ -1,15 +1,24 @@
 import shutil
 import tempfile
+from http import HTTPStatus
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.db import connection
+from django.http import HttpResponse
+from django.test import (Client, RequestFactory, TestCase,
+                         TransactionTestCase, override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from ..models import Comment, Follow, Group, Post
+from core.db import replicas
+
+from .. import caching
+from ..models import Comment, Follow, Group, Like, Post
 
 User = get_user_model()
 
@@ -224,6 +233,16 @@ class PostsTests(TestCase):
         self.assertEqual(response.context.get('is_edit'), True)
 
 
+    def test_forms_rendered_outside_transaction(self):
+        """Формы отдаются без транзакции: блокировка записи не берётся."""
+        for page in (self.create, self.edit):
+            with self.subTest(page=page):
+                with CaptureQueriesContext(connection) as queries:
+                    self.authorized_client.get(page)
+                self.assertFalse([query for query in queries
+                                  if 'SAVEPOINT' in query['sql']])
+
+
 class PaginatorViewsTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -265,8 +284,54 @@ class PaginatorViewsTest(TestCase):
         """ Проверка: на второй странице должно быть три поста."""
         for reverse_name in self.reverse_names:
             with self.subTest(reverse_name=reverse_name):
-                response = self.follower.get(reverse_name + '?page=2')
-                self.assertEqual(len(response.context['page_obj']), 3)
+                first_page = self.follower.get(reverse_name).context[
+                    'page_obj']
+                response = self.follower.get(
+                    reverse_name,
+                    {'cursor': first_page.paginator.next_cursor})
+                page_obj = response.context['page_obj']
+
+                self.assertEqual(len(page_obj), 3)
+                self.assertFalse(page_obj.has_next())
+                self.assertTrue(page_obj.has_previous())
+                self.assertFalse(set(page_obj) & set(first_page))
+
+    def test_previous_and_last_cursors(self):
+        """ Проверка: курсоры назад и на последнюю страницу."""
+        index = reverse('posts:index')
+        first_page = self.follower.get(index).context['page_obj']
+        last_page = self.follower.get(
+            index,
+            {'cursor': first_page.paginator.last_cursor}).context['page_obj']
+        previous_page = self.follower.get(
+            index,
+            {'cursor': last_page.paginator.previous_cursor}
+        ).context['page_obj']
+
+        self.assertEqual(list(last_page),
+                         list(Post.objects.order_by('-pub_date', '-id')[3:]))
+        self.assertFalse(last_page.has_next())
+        self.assertEqual(len(previous_page), 3)
+        self.assertEqual(previous_page[0], first_page[0])
+        self.assertFalse(previous_page.has_previous())
+
+    def test_invalid_cursor_returns_first_page(self):
+        """ Проверка: некорректный курсор открывает первую страницу."""
+        response = self.follower.get(reverse('posts:index'),
+                                     {'cursor': 'не-курсор'})
+
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+    def test_pages_do_not_count_posts(self):
+        """ Проверка: страница ленты не выполняет COUNT(*)."""
+        first_page = self.follower.get(reverse('posts:index')).context[
+            'page_obj']
+        with CaptureQueriesContext(connection) as queries:
+            self.follower.get(reverse('posts:index'),
+                              {'cursor': first_page.paginator.next_cursor})
+
+        self.assertFalse(any('COUNT(' in query['sql']
+                             for query in queries.captured_queries))
 
 
 class CommentTests(TestCase):
@@ -295,29 +360,233 @@ class CommentTests(TestCase):
         self.assertEqual(comment_obj, self.comment)
 
 
-class CacheTests(TestCase):
+class CacheTests(TransactionTestCase):
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
+        self.user = User.objects.create_user(username='TestUser')
+        self.group = Group.objects.create(title='Группа', slug='group',
+                                          description='Описание')
+        self.other_group = Group.objects.create(
+            title='Другая группа', slug='other', description='Описание')
 
     def test_index_page_being_cached(self):
         """Главная страница кэшируется"""
-        user = User.objects.create_user(username='TestUser')
-        post = Post.objects.create(author=user,
-                                   text='Тестовый текст')
-
         response_content = self.guest_client.get(
             reverse('posts:index')).content
+
+        with self.assertNumQueries(0):
+            response_content_cached = self.guest_client.get(
+                reverse('posts:index')).content
+        self.assertEqual(response_content, response_content_cached)
+
+    def test_hot_page_served_from_process_memory(self):
+        """Горячая страница читается из памяти процесса"""
+        page = reverse('posts:index')
+        response_content = self.guest_client.get(page).content
+
+        with mock.patch.object(caching.pages, 'shared') as shared:
+            response = self.guest_client.get(page)
+        shared.get.assert_not_called()
+        self.assertEqual(response.content, response_content)
+
+    def test_post_changes_invalidate_feeds(self):
+        """Создание и удаление поста сразу видно в лентах"""
+        pages = (reverse('posts:index'),
+                 reverse('posts:group_list', kwargs={'slug': 'group'}),
+                 reverse('posts:profile', kwargs={'username': 'TestUser'}))
+        for page in pages:
+            self.guest_client.get(page)
+        post = Post.objects.create(author=self.user, group=self.group,
+                                   text='Новый пост')
+
+        for page in pages:
+            with self.subTest(page=page):
+                self.assertIn(post.text.encode(),
+                              self.guest_client.get(page).content)
         post.delete()
-        response_content_post_delete = self.guest_client.get(
-            reverse('posts:index')).content
+        for page in pages:
+            with self.subTest(page=page):
+                self.assertNotIn(post.text.encode(),
+                                 self.guest_client.get(page).content)
+
+    def test_unrelated_feed_stays_cached(self):
+        """Пост в другой группе не сбрасывает кэш группы"""
+        page = reverse('posts:group_list', kwargs={'slug': 'group'})
+        self.guest_client.get(page)
+        Post.objects.create(author=self.user, group=self.other_group,
+                            text='Пост другой группы')
+
+        with self.assertNumQueries(0):
+            self.guest_client.get(page)
+
+    def test_moving_post_invalidates_old_group(self):
+        """Смена группы поста сбрасывает кэш прежней группы"""
+        post = Post.objects.create(author=self.user, group=self.group,
+                                   text='Переезжающий пост')
+        page = reverse('posts:group_list', kwargs={'slug': 'group'})
+        self.guest_client.get(page)
+        post.group = self.other_group
+        post.save()
+
+        self.assertNotIn(post.text.encode(),
+                         self.guest_client.get(page).content)
+
+    def test_author_rename_invalidates_feeds(self):
+        """Смена имени автора сразу видна в лентах и под комментариями"""
+        post = Post.objects.create(author=self.user, group=self.group,
+                                   text='Пост')
+        other = Post.objects.create(
+            author=User.objects.create_user(username='Other'), text='Чужой')
+        Comment.objects.create(post=other, author=self.user, text='Коммент')
+        pages = (reverse('posts:index'),
+                 reverse('posts:group_list', kwargs={'slug': 'group'}),
+                 reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+                 reverse('posts:post_detail', kwargs={'post_id': other.pk}))
+        for page in pages:
+            self.guest_client.get(page)
+        self.user.username = 'RenamedUser'
+        self.user.save()
+
+        for page in pages:
+            with self.subTest(page=page):
+                self.assertIn(b'RenamedUser',
+                              self.guest_client.get(page).content)
+
+    def test_stale_page_served_while_recomputed(self):
+        """Пока страницу пересчитывают, остальным отдаётся старая копия"""
+        page = reverse('posts:index')
+        stale_content = self.guest_client.get(page).content
+        post = Post.objects.create(author=self.user, text='Свежий пост')
+
+        with mock.patch('posts.caching._acquire', return_value=False):
+            with self.assertNumQueries(0):
+                response = self.guest_client.get(page)
+        self.assertEqual(response.content, stale_content)
+        self.assertIn(post.text.encode(), self.guest_client.get(page).content)
+
+    @override_settings(FEED_CACHE_TIMEOUT=60, FEED_CACHE_EARLY_BETA=10 ** 6)
+    def test_page_refreshed_early_with_probability(self):
+        """Страница может пересчитываться до истечения срока"""
+        page = reverse('posts:index')
+        response = self.guest_client.get(page)
+        self.assertFalse(response.has_header('Expires'))
+
+        with mock.patch('posts.caching.random.random', return_value=1.0):
+            with self.assertNumQueries(0):
+                self.guest_client.get(page)
+        with mock.patch('posts.caching.random.random', return_value=0.5):
+            with CaptureQueriesContext(connection) as queries:
+                self.guest_client.get(page)
+        self.assertTrue(queries.captured_queries)
+
+
+class ConditionalGetTests(TransactionTestCase):
+    def setUp(self):
         cache.clear()
-        response_content_cache_delete = self.guest_client.get(
-            reverse('posts:index')).content
-
-        self.assertEqual(response_content, response_content_post_delete)
-        self.assertNotEqual(response_content, response_content_cache_delete)
-        self.assertNotIn(post.text.encode('utf-8'),
-                         response_content_cache_delete)
+        self.user = User.objects.create_user(username='TestUser')
+        self.reader = User.objects.create_user(username='Reader')
+        self.post = Post.objects.create(author=self.user, text='Пост')
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+        self.pages = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': 'TestUser'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}))
+
+    def revalidate(self, client, page):
+        etag = client.get(page)['ETag']
+        return etag, client.get(page, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_pages_not_modified(self):
+        """Неизменившаяся страница отдаёт 304 без запросов к базе"""
+        for page in self.pages[:2]:
+            with self.subTest(page=page):
+                etag = self.guest_client.get(page)['ETag']
+                with self.assertNumQueries(0):
+                    response = self.guest_client.get(
+                        page, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code,
+                                 HTTPStatus.NOT_MODIFIED)
+
+    def test_if_modified_since(self):
+        """Страница без изменений после Last-Modified отдаёт 304"""
+        last_modified = self.guest_client.get(self.pages[0])['Last-Modified']
+        response = self.guest_client.get(
+            self.pages[0], HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_changes_and_viewer_change_validators(self):
+        """Комментарий, лайк и другой зритель меняют ETag"""
+        for page in self.pages:
+            with self.subTest(page=page):
+                guest_etag, response = self.revalidate(self.guest_client,
+                                                       page)
+                self.assertEqual(response.status_code,
+                                 HTTPStatus.NOT_MODIFIED)
+                reader_etag, _ = self.revalidate(self.authorized_client,
+                                                 page)
+                self.assertNotEqual(guest_etag, reader_etag)
+
+        etags = [self.guest_client.get(page)['ETag'] for page in self.pages]
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Комментарий')
+        Like.objects.create(post=self.post, user=self.reader)
+        for page, etag in zip(self.pages, etags):
+            with self.subTest(page=page):
+                response = self.guest_client.get(page,
+                                                 HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_group_rename_changes_detail_validators(self):
+        """Переименование группы поста меняет ETag его страницы"""
+        group = Group.objects.create(title='Группа', slug='group',
+                                     description='Описание')
+        self.post.group = group
+        self.post.save()
+        page = self.pages[2]
+        etag = self.guest_client.get(page)['ETag']
+        group.title = 'Новое название'
+        group.save()
+
+        response = self.guest_client.get(page, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, 'Новое название')
+
+    def test_missing_post_creates_no_generations(self):
+        """Несуществующий пост отдаёт 404 и не заводит поколений"""
+        cache.clear()
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': 10 ** 6}))
+
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        self.assertIsNone(cache.get(caching.GENERATION_KEY.format(
+            caching.post_scope(10 ** 6))))
+        self.assertIsNone(cache.get(caching.GENERATION_KEY.format(
+            caching.author_scope(None))))
+
+    def test_recent_changes_read_primary(self):
+        """Пока реплики могут отставать от смены поколения, страница
+        читается из основной базы."""
+        allowed = []
+        view = caching.condition_feed(lambda: [caching.index_scope()])(
+            lambda request: allowed.append(replicas.allowed())
+            or HttpResponse())
+        request = RequestFactory().get('/')
+        request.user = self.reader
+
+        with replicas.use_replicas():
+            caching.bump([caching.index_scope()])
+            view(request)
+            key = caching.GENERATION_KEY.format(caching.index_scope())
+            cache.set(key, cache.get(key) - 60 * 10 ** 9, None)
+            del request._feed_generations
+            view(request)
+
+        self.assertEqual(allowed, [False, True])
 
 
 class FollowTest(TestCase):
@@ -383,3 +652,147 @@ class FollowTest(TestCase):
                     kwargs={'username': f'{self.user_user.username}'}))
 
         self.assertEqual(Follow.objects.count(), follow_count)
+
+
+class FeedQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test',
+            description='Тестовое описание')
+        Follow.objects.create(user=cls.user, author=cls.user)
+        cls.reverse_names = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': cls.user.username}),
+            reverse('posts:follow_index'),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def count_queries(self, reverse_name):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(reverse_name)
+        return len(queries)
+
+    def test_feed_queries_do_not_depend_on_page_size(self):
+        """Число запросов ленты не растёт вместе с числом постов."""
+        Post.objects.create(author=self.user, text='Пост', group=self.group)
+        single_post = {name: self.count_queries(name)
+                       for name in self.reverse_names}
+        for i in range(settings.POSTS_PER_PAGE):
+            post = Post.objects.create(author=self.user, text=f'Пост {i}',
+                                       group=self.group)
+            Like.objects.create(user=self.user, post=post)
+            Comment.objects.create(author=self.user, post=post, text='Да')
+
+        for reverse_name in self.reverse_names:
+            with self.subTest(reverse_name=reverse_name):
+                self.assertEqual(self.count_queries(reverse_name),
+                                 single_post[reverse_name])
+
+    def test_feed_posts_have_liked_flag(self):
+        """Посты ленты знают, лайкнул ли их текущий пользователь."""
+        liked = Post.objects.create(author=self.user, text='Лайк')
+        Like.objects.create(user=self.user, post=liked)
+        Post.objects.create(author=self.user, text='Без лайка')
+
+        for reverse_name in self.reverse_names[::2]:
+            with self.subTest(reverse_name=reverse_name):
+                page_obj = self.authorized_client.get(
+                    reverse_name).context['page_obj']
+                self.assertEqual(
+                    [(post.text, post.is_liked, post.likes_count)
+                     for post in page_obj],
+                    [('Без лайка', False, 0), ('Лайк', True, 1)])
+
+
+class PostDetailQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test',
+            description='Тестовое описание')
+        cls.post = Post.objects.create(author=cls.user, text='Пост',
+                                       group=cls.group)
+        for i in range(5):
+            commenter = User.objects.create_user(username=f'commenter{i}')
+            Comment.objects.create(post=cls.post, author=commenter,
+                                   text=f'Комментарий {i}')
+            Like.objects.create(post=cls.post, user=commenter)
+        cls.detail = reverse('posts:post_detail',
+                             kwargs={'post_id': cls.post.pk})
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_post_detail_query_count(self):
+        """Страница поста: валидаторы, пост с агрегатами, комментарии."""
+        with self.assertNumQueries(3):
+            response = self.guest_client.get(self.detail)
+        self.assertEqual(len(response.context['comments']), 5)
+        self.assertEqual(response.context['post_likes_count'], 5)
+        self.assertEqual(response.context['author_posts_count'], 1)
+        self.assertFalse(response.context['is_liked'])
+
+        # Плюс сессия и пользователь.
+        with self.assertNumQueries(5):
+            response = self.authorized_client.get(self.detail)
+        self.assertTrue(response.context['is_edit'])
+
+    @override_settings(COMMENTS_PER_PAGE=2)
+    def test_comments_paginated_and_loaded_by_fragments(self):
+        """Комментарии показываются порциями, следующие — по ссылке."""
+        response = self.guest_client.get(self.detail)
+        comments = response.context['comments']
+        self.assertEqual([comment.text for comment in comments],
+                         ['Комментарий 4', 'Комментарий 3'])
+        more = reverse('posts:post_comments',
+                       kwargs={'post_id': self.post.pk})
+        self.assertContains(
+            response, f'{more}?cursor={comments.paginator.next_cursor}')
+
+        texts = []
+        cursor = comments.paginator.next_cursor
+        while cursor:
+            with self.assertNumQueries(3):
+                response = self.guest_client.get(more, {'cursor': cursor})
+            self.assertTemplateUsed(response, 'includes/comment_list.html')
+            texts += [comment.text for comment in response.context['comments']]
+            cursor = response.context['comments'].paginator.next_cursor
+        self.assertEqual(texts, ['Комментарий 2', 'Комментарий 1',
+                                 'Комментарий 0'])
+
+    @override_settings(COMMENTS_PER_PAGE=3)
+    def test_comments_json(self):
+        """С format=json порция комментариев отдаётся в JSON."""
+        more = reverse('posts:post_comments',
+                       kwargs={'post_id': self.post.pk})
+        first = self.guest_client.get(more, {'format': 'json'}).json()
+        second = self.guest_client.get(
+            more, {'format': 'json', 'cursor': first['next']}).json()
+
+        self.assertEqual([comment['text'] for comment in first['comments']],
+                         ['Комментарий 4', 'Комментарий 3', 'Комментарий 2'])
+        self.assertEqual(first['comments'][0]['author'], 'commenter4')
+        self.assertEqual(len(second['comments']), 2)
+        self.assertIsNone(second['next'])
+
+    def test_comments_of_missing_post(self):
+        """Для несуществующего поста фрагмент отвечает 404."""
+        response = self.guest_client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 10 ** 6}))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
@@ -0,0 +1,177 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count
+
+from .models import Follow, Post, TimelineEntry, User
+from .utils import NEXT, CursorPaginator
+
+CELEBRITIES_CACHE_KEY = 'timeline_celebrities'
+
+# Временная таблица последних постов авторов для `rebuild`.
+RECENT = 'timeline_recent_posts'
+
+
+def celebrity_ids():
+    """Авторы, чьи посты не раскладываются по лентам, а читаются на лету.
+
+    Это авторы, у которых не меньше `TIMELINE_FANOUT_LIMIT` подписчиков.
+    Если порог не задан, гибридный режим выключен.
+    """
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    if limit is None:
+        return frozenset()
+    ids = cache.get(CELEBRITIES_CACHE_KEY)
+    if ids is None:
+        ids = frozenset(
+            Follow.objects.values('author')
+            .annotate(followers=Count('id'))
+            .filter(followers__gte=limit)
+            .values_list('author', flat=True))
+        cache.set(CELEBRITIES_CACHE_KEY, ids,
+                  settings.TIMELINE_CELEBRITIES_TIMEOUT)
+    return ids
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты всех подписчиков автора."""
+    if post.author_id in celebrity_ids():
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in followers.iterator()),
+        batch_size=settings.TIMELINE_BATCH_SIZE)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту пользователя последние посты автора."""
+    if author_id in celebrity_ids():
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-pk').values_list('pk', 'pub_date')
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+         for post_id, pub_date in posts[:settings.TIMELINE_BACKFILL]),
+        batch_size=settings.TIMELINE_BATCH_SIZE, ignore_conflicts=True)
+
+
+def trim(user_id, author_id):
+    """Убирает из ленты пользователя посты автора."""
+    TimelineEntry.objects.filter(user_id=user_id,
+                                 post__author_id=author_id).delete()
+
+
+def unfollow(user_id, author_id):
+    """Чистит ленту отписавшегося и раскладывает посты бывшей знаменитости.
+
+    Пока автор был знаменитостью, его новые посты и подписки на него не
+    попадали в ленты. Когда отписка опускает его ниже порога, эти посты
+    раскладываются по лентам всех оставшихся подписчиков.
+    """
+    trim(user_id, author_id)
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    followers = Follow.objects.filter(author_id=author_id)
+    if limit is None or followers.count() != limit - 1:
+        return
+    cache.delete(CELEBRITIES_CACHE_KEY)
+    posts = list(Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-pk').values_list('pk', 'pub_date')[
+            :settings.TIMELINE_BACKFILL])
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=follower_id, post_id=post_id,
+                       pub_date=pub_date)
+         for follower_id in followers.values_list(
+             'user_id', flat=True).iterator()
+         for post_id, pub_date in posts),
+        batch_size=settings.TIMELINE_BATCH_SIZE, ignore_conflicts=True)
+
+
+def rebuild():
+    """Заново заполняет все ленты и возвращает число записей.
+
+    Последние `TIMELINE_BACKFILL` постов каждого автора, кроме
+    знаменитостей, один раз выбираются во временную таблицу. Затем ленты
+    пишутся через INSERT ... SELECT пачками по `TIMELINE_BATCH_SIZE`
+    пользователей, каждая пачка в своей транзакции. Поэтому блокировка
+    записи не держится всё время пересборки, а строки не проходят через
+    Python.
+    """
+    cache.delete(CELEBRITIES_CACHE_KEY)
+    celebrities = list(celebrity_ids())
+    entries = TimelineEntry._meta.db_table
+    follows = Follow._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS temp.{RECENT}')
+        cursor.execute(
+            f'''CREATE TEMP TABLE {RECENT} AS
+            SELECT id, author_id, pub_date FROM (
+                SELECT id, author_id, pub_date, ROW_NUMBER() OVER (
+                    PARTITION BY author_id ORDER BY pub_date DESC, id DESC
+                ) AS position
+                FROM {Post._meta.db_table}
+            ) WHERE position <= %s''', [settings.TIMELINE_BACKFILL])
+        for start in range(0, len(celebrities), 500):
+            chunk = celebrities[start:start + 500]
+            cursor.execute(
+                f'DELETE FROM {RECENT} WHERE author_id IN '
+                f'({", ".join(["%s"] * len(chunk))})', chunk)
+        cursor.execute(
+            f'CREATE INDEX temp.{RECENT}_author ON {RECENT} (author_id)')
+    users = User.objects.order_by('pk').values_list('pk', flat=True)
+    last = 0
+    try:
+        while True:
+            batch = list(users.filter(pk__gt=last)[
+                :settings.TIMELINE_BATCH_SIZE])
+            if not batch:
+                break
+            first, last = batch[0], batch[-1]
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {entries} WHERE user_id BETWEEN %s AND %s',
+                    [first, last])
+                cursor.execute(
+                    f'''INSERT INTO {entries} (user_id, post_id, pub_date)
+                    SELECT f.user_id, r.id, r.pub_date
+                    FROM {follows} f
+                    JOIN {RECENT} r ON r.author_id = f.author_id
+                    WHERE f.user_id BETWEEN %s AND %s''', [first, last])
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS temp.{RECENT}')
+    return TimelineEntry.objects.count()
+
+
+class TimelinePaginator(CursorPaginator):
+    """Лента подписок: материализованные записи плюс посты знаменитостей.
+
+    Записи ленты читаются одним диапазоном по индексу
+    `(user, pub_date, post)`, затем посты выбираются по ключам через
+    `for_feed`. Посты авторов из `celebrity_ids()`, на которых подписан
+    пользователь, выбираются тем же окном и сливаются с записями.
+    """
+
+    def __init__(self, user, per_page):
+        celebrities = celebrity_ids()
+        posts = Post.objects.none()
+        if celebrities:
+            posts = Post.objects.for_feed(user).filter(
+                author__following__user=user, author_id__in=celebrities)
+        super().__init__(posts, per_page)
+        self.user = user
+        self.with_celebrities = bool(celebrities)
+
+    def _fetch(self, direction, values):
+        entries = self._window(
+            TimelineEntry.objects.filter(user=self.user),
+            ('pub_date', 'post_id'), direction, values)
+        posts = Post.objects.for_feed(self.user).in_bulk(
+            list(entries.values_list('post_id', flat=True)))
+        if self.with_celebrities:
+            posts.update((post.pk, post) for post in self._window(
+                self.object_list, self.keys, direction, values))
+        return sorted(posts.values(), key=lambda post: (post.pub_date,
+                                                        post.pk),
+                      reverse=direction == NEXT)[:self.per_page + 1]
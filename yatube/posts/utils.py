@@ -1,9 +1,126 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Paginator
+from django.db.models import Q
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class CursorPaginator(Paginator):
+    """Паджинатор по ключу (keyset) вместо LIMIT/OFFSET.
+
+    Страница выбирается условием по ключевым полям (по умолчанию
+    `pub_date, pk`) относительно курсора, поэтому любая страница стоит
+    столько же, сколько первая, а COUNT(*) не выполняется. Курсоры
+    непрозрачны для клиента и передаются в параметре `cursor`.
+    Объекты упорядочены по убыванию ключевых полей.
+
+    `number` и `num_pages` описывают положение относительно курсора
+    (есть ли страницы до и после), а не абсолютный номер страницы.
+    """
+
+    def __init__(self, object_list, per_page, keys=('pub_date', 'pk')):
+        super().__init__(object_list, per_page)
+        self.keys = keys
+        self.next_cursor = None
+        self.previous_cursor = None
+        self._number = 1
+        self._has_next = False
+
+    @property
+    def num_pages(self):
+        return self._number + self._has_next
+
+    @property
+    def last_cursor(self):
+        return self.encode(PREVIOUS)
+
+    def _field(self, name):
+        opts = self.object_list.model._meta
+        return opts.pk if name == 'pk' else opts.get_field(name)
+
+    def encode(self, direction, obj=None):
+        """Кодирует направление и ключ объекта в строку курсора."""
+        parts = [direction]
+        if obj is not None:
+            parts += [self._field(name).value_to_string(obj)
+                      for name in self.keys]
+        raw = '|'.join(parts).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode(self, cursor):
+        """Возвращает направление и значения ключа из строки курсора."""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, *values = raw.decode().split('|')
+            if direction not in (NEXT, PREVIOUS) or (
+                    values and len(values) != len(self.keys)):
+                raise ValueError
+            values = [self._field(name).to_python(value)
+                      for name, value in zip(self.keys, values)]
+        except (binascii.Error, UnicodeDecodeError, ValueError,
+                ValidationError):
+            raise InvalidPage('Некорректный курсор')
+        return direction, values
+
+    @staticmethod
+    def _keyset_filter(keys, values, lookup):
+        """Условие "ключ строго меньше/больше values" для кортежа полей."""
+        condition = Q()
+        for i, name in enumerate(keys):
+            step = Q(**{f'{name}__{lookup}': values[i]})
+            for prev_name, prev_value in zip(keys[:i], values[:i]):
+                step &= Q(**{prev_name: prev_value})
+            condition |= step
+        return condition
+
+    def _window(self, queryset, keys, direction, values):
+        """Не больше per_page + 1 объектов queryset после курсора."""
+        if direction == NEXT:
+            ordering, lookup = [f'-{name}' for name in keys], 'lt'
+        else:
+            ordering, lookup = list(keys), 'gt'
+        if values:
+            queryset = queryset.filter(
+                self._keyset_filter(keys, values, lookup))
+        return queryset.order_by(*ordering)[:self.per_page + 1]
+
+    def _fetch(self, direction, values):
+        return list(self._window(self.object_list, self.keys,
+                                 direction, values))
+
+    def get_page(self, cursor):
+        """Возвращает страницу; некорректный курсор ведёт на первую."""
+        direction, values = NEXT, []
+        if cursor:
+            try:
+                direction, values = self.decode(cursor)
+            except InvalidPage:
+                pass
+        return self.page(direction, values)
+
+    def page(self, direction=NEXT, values=()):
+        objects = self._fetch(direction, values)
+        has_more = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        if direction == NEXT:
+            has_previous, self._has_next = bool(values), has_more
+        else:
+            objects.reverse()
+            has_previous, self._has_next = has_more, bool(values)
+        if objects and has_previous:
+            self.previous_cursor = self.encode(PREVIOUS, objects[0])
+        if objects and self._has_next:
+            self.next_cursor = self.encode(NEXT, objects[-1])
+        self._number = 2 if self.previous_cursor else 1
+        return self._get_page(objects, self._number, self)
 
 
 def paginator(request, posts, posts_per_page):
     """Функция-паджинатор. Разбивает список постов на несколько страниц"""
-    paginator = Paginator(posts, posts_per_page)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = CursorPaginator(posts, posts_per_page)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     return page_obj
@@ -1,34 +1,72 @@
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
 
+from core.db.retry import atomic_retry
+
+from .caching import (author_scope, cache_feed, condition_feed, group_scope,
+                      index_scope, post_scope)
+from .counters import posts_count
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User, Like
-from .utils import paginator
+from .models import Comment, Follow, Group, Post, User, Like
+from .search import SearchPaginator
+from .timeline import TimelinePaginator
+from .utils import CursorPaginator, paginator
+
+
+def index_scopes():
+    return [index_scope()]
+
+
+def group_scopes(slug):
+    return [group_scope(slug)]
+
+
+def profile_scopes(username):
+    return [author_scope(username)]
+
+
+def detail_scopes(post_id):
+    """Области страницы поста; для несуществующего поста — никаких."""
+    row = Post.objects.filter(pk=post_id).values_list(
+        'author__username', 'group__slug').first()
+    if row is None:
+        return []
+    username, slug = row
+    scopes = [post_scope(post_id), author_scope(username)]
+    if slug:
+        scopes.append(group_scope(slug))
+    return scopes
 
 
-@cache_page(20, key_prefix='index_page')
+@condition_feed(index_scopes)
+@cache_feed(index_scopes)
 def index(request):
-    post_list = Post.objects.all()
+    post_list = Post.objects.for_feed(request.user)
     context = {'page_obj': paginator(request, post_list,
                                      settings.POSTS_PER_PAGE), }
     return render(request, 'posts/index.html', context)
 
 
+@condition_feed(group_scopes)
+@cache_feed(group_scopes)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
+    post_list = group.posts.for_feed(request.user)
     context = {'group': group,
                'page_obj': paginator(request, post_list,
                                      settings.POSTS_PER_PAGE)}
     return render(request, 'posts/group_list.html', context)
 
 
+@condition_feed(profile_scopes)
+@cache_feed(profile_scopes)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    author_posts = author.posts.all()
-    author_posts_count = author_posts.count()
+    author = get_object_or_404(User.objects.select_related('stats'),
+                               username=username)
+    author_posts = author.posts.for_feed(request.user)
+    author_posts_count = posts_count(author)
     if request.user.is_authenticated:
         following = Follow.objects.filter(
             user=request.user, author=author).exists()
@@ -43,32 +81,70 @@ def profile(request, username):
     return render(request, 'posts/profile.html', context)
 
 
+@condition_feed(detail_scopes)
 def post_detail(request, post_id):
-    post = get_object_or_404(
-        Post.objects.filter(pk=post_id).select_related('author'))
-    author = post.author
-    author_posts_count = author.posts.count()
-    form = CommentForm(request.POST or None)
-    comments = post.comments.all()
-    if request.user.is_authenticated:
-        is_liked = Like.objects.filter(
-            user=request.user, post=post).exists()
-    else:
-        is_liked = False
-    post_likes_count = Like.objects.filter(post=post).count()
-    context = {'post': post, 'author_posts_count': author_posts_count,
-               'form': form, 'comments': comments, 'is_liked': is_liked, 
-               'post_likes_count': post_likes_count}
+    post = get_object_or_404(Post.objects.for_detail(request.user),
+                             pk=post_id)
+    context = {'post': post,
+               'author_posts_count': posts_count(post.author),
+               'form': CommentForm(request.POST or None),
+               'comments': comments_page(post.pk, None),
+               'is_liked': post.is_liked,
+               'post_likes_count': post.likes_count}
     if request.user == post.author:
-        context = {'post': post,
-                   'author_posts_count': author_posts_count,
-                   'form': form, 'comments': comments,
-                   'is_liked': is_liked,
-                   'post_likes_count': post_likes_count,
-                   'is_edit': True}
+        context['is_edit'] = True
     return render(request, 'posts/post_detail.html', context)
 
 
+def search(request):
+    """Поиск по тексту постов, названиям групп и именам авторов."""
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        page_obj = SearchPaginator(
+            query, request.user, settings.POSTS_PER_PAGE).get_page(
+                request.GET.get('cursor'))
+    context = {'query': query, 'page_obj': page_obj}
+    return render(request, 'posts/search.html', context)
+
+
+def comments_page(post_id, cursor):
+    """Страница комментариев поста, новые сначала."""
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author')
+    return CursorPaginator(comments, settings.COMMENTS_PER_PAGE,
+                           keys=('created', 'pk')).get_page(cursor)
+
+
+@condition_feed(detail_scopes)
+def post_comments(request, post_id):
+    """Следующая порция комментариев: HTML-фрагмент или JSON."""
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    comments = comments_page(post.pk, request.GET.get('cursor'))
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [{'id': comment.pk,
+                          'author': comment.author.username,
+                          'text': comment.text,
+                          'created': comment.created.isoformat()}
+                         for comment in comments],
+            'next': comments.paginator.next_cursor})
+    return render(request, 'includes/comment_list.html',
+                  {'post': post, 'comments': comments})
+
+
+def save_post(post):
+    """Сохраняет пост, держа блокировку записи только на время UPDATE.
+
+    Новая картинка пишется в хранилище до транзакции, поэтому загрузка
+    файла не задерживает остальных писателей.
+    """
+    image = post.image
+    if image and not image._committed:
+        image.save(image.name, image.file, save=False)
+    atomic_retry(post.save)()
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None,)
@@ -76,7 +152,7 @@ def post_create(request):
         if form.is_valid():
             post = form.save(commit=False)
             post.author = request.user
-            post.save()
+            save_post(post)
             return redirect('posts:profile', username=post.author)
     context = {'form': form}
     return render(request, 'posts/create_post.html', context)
@@ -92,7 +168,7 @@ def post_edit(request, post_id):
                         files=request.FILES or None,
                         instance=post)
         if form.is_valid():
-            form.save()
+            save_post(form.save(commit=False))
             return redirect('posts:post_detail', post_id)
     form = PostForm(instance=post)
     context = {'form': form, 'is_edit': True}
@@ -107,21 +183,23 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        atomic_retry(comment.save)()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    is_following = post_list.exists()
-    context = {'page_obj': paginator(request, post_list,
-                                     settings.POSTS_PER_PAGE),
+    page_obj = TimelinePaginator(
+        request.user, settings.POSTS_PER_PAGE).get_page(
+            request.GET.get('cursor'))
+    is_following = bool(page_obj.object_list) or page_obj.has_previous()
+    context = {'page_obj': page_obj,
                'is_following': is_following}
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@atomic_retry
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
@@ -132,6 +210,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@atomic_retry
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     user_follow_author = Follow.objects.filter(user=request.user,
@@ -143,12 +222,14 @@ def profile_unfollow(request, username):
 
 
 @login_required
+@atomic_retry
 def post_like(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     Like.objects.create(user=request.user, post = post)
     return redirect('posts:post_detail', post_id=post_id)
 
 @login_required
+@atomic_retry
 def post_unlike(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     user_like_post = Like.objects.filter(user=request.user, post=post)
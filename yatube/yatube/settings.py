@@ -1,7 +1,20 @@
+import atexit
 import os
+import shutil
+import sys
+import tempfile
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+
+# Каталог для кэша, метрик и журналов. Тесты получают временный, чтобы не
+# читать и не стирать файлы рабочей копии.
+RUNTIME_DIR = BASE_DIR
+if TESTING:
+    RUNTIME_DIR = tempfile.mkdtemp(prefix='yatube-tests-')
+    atexit.register(shutil.rmtree, RUNTIME_DIR, ignore_errors=True)
+
 SECRET_KEY = 'q+m3-=c%6+eq%om$5-a88qk(0sbi2u((l5wql&^9j1rowp@!v9'
 
 LOGIN_URL = 'users:login'
@@ -16,7 +29,11 @@ DEBUG = True
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(RUNTIME_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_BYTES': 64 * 1024 * 1024,
+        },
     }
 }
 
@@ -30,7 +47,8 @@ ALLOWED_HOSTS = ['localhost',
                  'igorcodit.pythonanywhere.com',]
 
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    # django.contrib.admin со страницами отчётов, см. core/admin.py.
+    'core.apps.AdminConfig',
     'posts.apps.PostsConfig',
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
@@ -50,20 +68,118 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Бэкенд sorl-thumbnail с замером времени для Server-Timing.
+THUMBNAIL_BACKEND = 'core.thumbnail.ThumbnailBackend'
+
 POSTS_PER_PAGE = 10
 
-MIDDLEWARE = [
+COMMENTS_PER_PAGE = 20
+
+# Страницы лент живут в кэше до смены поколения, см. posts.caching.
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Сколько устаревшая страница ещё может отдаваться, пока её пересчитывают.
+FEED_CACHE_STALE_TIMEOUT = 60 * 10
+
+FEED_CACHE_LOCK_TIMEOUT = 10
+
+FEED_CACHE_EARLY_BETA = 1.0
+
+# Копия горячих страниц в памяти каждого воркера.
+FEED_LOCAL_CACHE_ENTRIES = 128
+
+FEED_LOCAL_CACHE_TIMEOUT = 5
+
+# Авторы с таким числом подписчиков не раскладываются по лентам подписок,
+# их посты подмешиваются при чтении. None выключает гибридный режим.
+# После смены порога ленты пересобирает manage.py rebuild_timelines.
+TIMELINE_FANOUT_LIMIT = 10000
+
+TIMELINE_CELEBRITIES_TIMEOUT = 60 * 5
 
+TIMELINE_BACKFILL = 1000
+
+TIMELINE_BATCH_SIZE = 1000
+
+MIDDLEWARE = [
+    'core.instrumentation.InstrumentationMiddleware',
+    'core.instrumentation.ServerTimingMiddleware',
+    'core.db.nplusone.NPlusOneMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.db.replicas.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+# Запросы к базе дольше этого числа миллисекунд пишутся в журнал
+# с планом выполнения, см. core/db/slowlog.py; None — не писать.
+SLOW_QUERY_MS = 100
+
+SLOW_QUERY_LOG = os.path.join(RUNTIME_DIR, 'slow_queries.log')
+
+SLOW_QUERY_LOG_BACKUPS = 5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': SLOW_QUERY_LOG_BACKUPS,
+            'encoding': 'utf-8',
+            'delay': True,
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'core.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+# Доля запросов, которые профилируются, см. core/profiling.py; сотрудник
+# может запросить профиль заголовком PROFILING_HEADER.
+PROFILING_SAMPLE_RATE = float(os.environ.get('YATUBE_PROFILING_RATE', 0))
+
+PROFILING_HEADER = 'X-Profile'
+
+PROFILING_DIR = os.path.join(BASE_DIR, 'profiles')
+
+# Общий для всех воркеров файл метрик Prometheus, см. core/metrics.py.
+METRICS_PATH = os.path.join(RUNTIME_DIR, 'metrics.sqlite3')
+
+METRICS_FLUSH_INTERVAL = 1
+
+# Адреса, с которых /metrics читается без входа (сборщик Prometheus).
+METRICS_ALLOWED_IPS = ['127.0.0.1']
+
+# Поиск N+1 в каждом запросе, см. core/db/nplusone.py: 'warn', 'raise'
+# или None. Срабатывает, когда один и тот же по форме SELECT выполнен
+# хотя бы с NPLUSONE_THRESHOLD разными параметрами.
+NPLUSONE_MODE = 'warn' if DEBUG else None
+
+NPLUSONE_THRESHOLD = 3
+
+# Регулярные выражения для форм SQL, которые не считаются N+1.
+NPLUSONE_IGNORE = []
+
+# Приложения, ответы которых получают заголовок Server-Timing.
+SERVER_TIMING_APPS = ('posts', 'users')
+
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
@@ -72,7 +188,9 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с замером времени отрисовки.
+        'BACKEND': 'core.instrumentation.DjangoTemplates',
+        'NAME': 'django',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -89,13 +207,64 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+SQLITE = {
+    # sqlite3 с WAL и BEGIN IMMEDIATE, см. core/db/sqlite3/base.py.
+    'ENGINE': 'core.db.sqlite3',
+    'CONN_MAX_AGE': 600,
+    'OPTIONS': {
+        'timeout': 20,
+    },
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        **SQLITE,
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+    },
+    'sessions': {
+        **SQLITE,
+        'NAME': os.path.join(BASE_DIR, 'sessions.sqlite3'),
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
 }
 
+# Приложения, таблицы которых живут в отдельных файлах (см.
+# core/db/routers.py). Кэш и так хранится в своём файле, см. CACHES.
+DATABASE_APPS = {
+    'sessions': 'sessions',
+}
+
+# Реплики только для чтения — копии default, которые обновляет
+# `manage.py sync_replicas`. Локально их число задаёт YATUBE_REPLICAS.
+DATABASE_REPLICAS = [
+    f'replica{i}'
+    for i in range(1, int(os.environ.get('YATUBE_REPLICAS', 0)) + 1)
+]
+for alias in DATABASE_REPLICAS:
+    DATABASES[alias] = {
+        **SQLITE,
+        'NAME': os.path.join(BASE_DIR, f'{alias}.sqlite3'),
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    }
+
+# Сколько секунд реплики могут отставать: столько после записи клиент
+# читает основную базу.
+DATABASE_REPLICA_LAG = 5
+
+DATABASE_ROUTERS = [
+    'core.db.routers.AppRouter',
+    'core.db.routers.ReplicaRouter',
+]
+
+# Сколько раз повторять транзакцию записи, не дождавшуюся блокировки,
+# и начальная пауза между попытками в секундах.
+SQLITE_RETRY_ATTEMPTS = 5
+SQLITE_RETRY_BACKOFF = 0.05
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {